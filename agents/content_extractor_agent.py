@@ -1,13 +1,16 @@
 # agents/content_extractor_agent.py
 
+import os
 import sys
 import time
-import requests
 import fitz  # PyMuPDF
 from pathlib import Path
 import re
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
 import random
+import json
+from datetime import timedelta
+from contextlib import nullcontext
 from urllib.parse import urljoin, unquote
 
 # --- Блок инициализации ---
@@ -16,53 +19,133 @@ sys.path.append(str(project_root))
 from dotenv import load_dotenv
 load_dotenv()
 
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-from readability import Document
 from services.storage_service import StorageService
-from agents.summary_agent import cleanup_text
+from services.pdf_downloader import SpooledPdf, download_pdf, download_first_pdf, TIMEOUT_REASON
+from services.raw_document_cache import RawDocumentCache
+from services.url_rewriter import UrlRewriter
+from services.page_renderer import RenderTimeout, RendererUnavailable, open_page_renderer
+from services.html_document import HtmlDocument
+from services.extraction_metrics import extraction_metrics
+from services.http_client import get_http_client
+from services.host_timeouts import Deadline, DeadlineExceeded, HostBackedOff, HostTimeoutPolicy
+from services.section_segmenter import segment_and_clean
 
 # --- Константы ---
 MAX_NAVIGATION_HOPS = 3
-REQUESTS_TIMEOUT = 30
+REQUESTS_TIMEOUT = 30 # Верхняя граница; реальный таймаут подбирается по хосту (HostTimeoutPolicy)
+ARTICLE_DEADLINE_SECONDS = float(os.getenv('EXTRACTION_ARTICLE_DEADLINE_SEC', 75))
+MAX_EXTRACTION_DEFERRALS = int(os.getenv('MAX_EXTRACTION_DEFERRALS', 5))
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
 MIN_PDF_SIZE_BYTES = 10 * 1024 # 10 КБ
+# Признаки прямой ссылки на файл: такие URL сразу скачиваются, без рендера страницы
+DIRECT_PDF_URL_PATTERN = re.compile(r'(\.pdf($|[?#])|download|arxiv\.org/pdf/|/pdf(direct)?(/|$|\?)|/content/pdf/)', re.IGNORECASE)
+PAUSE_BETWEEN_ARTICLES = (2, 5) # Вежливая пауза между статьями, сек
+URL_RESOLUTION_TTL = timedelta(days=int(os.getenv('URL_RESOLUTION_TTL_DAYS', 30)))
+# Статусы, которые можно безопасно пересчитать при повторном извлечении из кэша
+REEXTRACTION_STATUSES = ['awaiting_full_summary', 'awaiting_abstract_summary', 'image_pdf_extracted', 'extraction_failed']
 
-def parse_pdf_from_binary(pdf_data: bytes) -> Tuple[Optional[str], bool]:
+PAGE_MARGIN_RATIO = 0.08 # Доля высоты страницы, где живут колонтитулы
+REPEATED_MARGIN_MIN_SHARE = 0.5 # На какой доле страниц строка должна повторяться, чтобы считаться колонтитулом
+PAGE_NUMBER_PATTERN = re.compile(r'^\s*(?:page|стр\.?)?\s*\d{1,4}(?:\s*(?:of|из|/)\s*\d{1,4})?\s*$', re.IGNORECASE)
+DIGITS_PATTERN = re.compile(r'\d+')
+
+def _page_lines(page) -> list:
+    """Возвращает строки страницы как (x0, y0, x1, y1, text) за один вызов get_text."""
+    lines = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        for line in block.get("lines", []):
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if text:
+                lines.append((*line["bbox"], text))
+    return lines
+
+def _order_lines_by_columns(lines: list, page_width: float) -> list:
+    """
+    Упорядочивает строки страницы с учетом колонок.
+    Строки во всю ширину делят страницу на полосы; внутри полосы сначала
+    читается левая колонка сверху вниз, затем правая.
+    """
+    middle = page_width / 2
+    ordered, left, right = [], [], []
+    for line in sorted(lines, key=lambda l: (l[1], l[0])):
+        x0, x1 = line[0], line[2]
+        if x1 <= middle + 1:
+            left.append(line)
+        elif x0 >= middle - 1:
+            right.append(line)
+        else:
+            # Строка во всю ширину закрывает текущую полосу колонок
+            ordered.extend(left); ordered.extend(right)
+            left, right = [], []
+            ordered.append(line)
+    ordered.extend(left); ordered.extend(right)
+    return ordered
+
+def _margin_key(text: str) -> str:
+    """Ключ для сравнения колонтитулов: без цифр (номера страниц) и лишних пробелов."""
+    return DIGITS_PATTERN.sub('#', ' '.join(text.split())).lower()
+
+def parse_pdf_from_binary(pdf_data: Union[bytes, memoryview]) -> Tuple[Optional[str], bool]:
+    """
+    Извлекает текст из PDF за один проход по страницам.
+    Строки каждой страницы читаются один раз, упорядочиваются по колонкам,
+    повторяющиеся колонтитулы и номера страниц отбрасываются.
+    Возвращает (текст, is_image_only).
+    """
     try:
-        text, is_image_only = "", True
+        pages = []
+        margin_counts = {}
+        has_text_layer = False
         with fitz.open(stream=pdf_data, filetype="pdf") as doc:
             for page in doc:
-                if page.get_text("blocks"): is_image_only = False
-                text += page.get_text()
-        if not text.strip() and not is_image_only: return (None, False)
-        if not text.strip() and is_image_only: return (None, True)
-        return (text.strip(), False)
+                height = page.rect.height
+                top_limit, bottom_limit = height * PAGE_MARGIN_RATIO, height * (1 - PAGE_MARGIN_RATIO)
+                lines = _page_lines(page)
+                if lines: has_text_layer = True
+                page_lines = []
+                for x0, y0, x1, y1, text in _order_lines_by_columns(lines, page.rect.width):
+                    in_margin = y1 <= top_limit or y0 >= bottom_limit
+                    if in_margin:
+                        if PAGE_NUMBER_PATTERN.match(text): continue
+                        key = _margin_key(text)
+                        margin_counts[key] = margin_counts.get(key, 0) + 1
+                    page_lines.append((text, in_margin))
+                pages.append(page_lines)
+
+        min_repeats = max(2, int(len(pages) * REPEATED_MARGIN_MIN_SHARE))
+        running_heads = {key for key, count in margin_counts.items() if count >= min_repeats}
+        page_texts = []
+        for page_lines in pages:
+            kept = [text for text, in_margin in page_lines if not (in_margin and _margin_key(text) in running_heads)]
+            if kept: page_texts.append('\n'.join(kept))
+        text = '\n\n'.join(page_texts).strip()
+
+        if not text: return (None, not has_text_layer)
+        return (text, False)
     except Exception:
         return (None, False)
 
 # --- ИЗМЕНЕНИЕ: Полностью переработанная функция поиска ---
-def find_best_pdf_link(soup: BeautifulSoup, base_url: str) -> Optional[str]:
+def find_best_pdf_link(document: HtmlDocument) -> Optional[str]:
     """
     Ищет лучшую ссылку на PDF, используя многоуровневую стратегию:
     1. Ищет прямую ссылку в мета-тегах.
     2. Если не находит, ищет лучшую видимую ссылку на странице.
     """
     # Стратегия 1: Поиск в мета-тегах (самый надежный способ)
-    meta_tag = soup.find('meta', {'name': 'citation_pdf_url'})
-    if meta_tag and meta_tag.get('content'):
+    meta_pdf_url = document.meta_content('citation_pdf_url')
+    if meta_pdf_url:
         print("    -> Найдена надежная ссылка в мета-теге citation_pdf_url!")
-        return meta_tag.get('content')
+        return urljoin(document.url, meta_pdf_url) # Некоторые издатели пишут в мета-тег относительный путь
 
     # Стратегия 2: Анализ видимых ссылок (старая логика)
     candidates = []
-    for link in soup.find_all('a', href=True):
-        href = link.get('href', '')
-        if not href or href.startswith('javascript:'): continue
+    for href, text, classes in document.links():
+        if href.startswith('javascript:'): continue
 
-        full_url = urljoin(base_url, href)
+        full_url = urljoin(document.url, href)
         decoded_url = unquote(full_url).lower()
-        link_text = link.get_text(strip=True).lower()
+        link_text = text.lower()
         
         score = 0
         if 'pdf' in link_text or '.pdf' in decoded_url or '/pdf' in decoded_url: score += 10
@@ -70,7 +153,7 @@ def find_best_pdf_link(soup: BeautifulSoup, base_url: str) -> Optional[str]:
         if 'full text' in link_text: score += 3
         
         # Улучшенное правило: добавляем очки, если класс содержит 'pdf'
-        link_class = ' '.join(link.get('class', [])).lower()
+        link_class = ' '.join(classes).lower()
         if 'pdf' in link_class:
             score += 15
         
@@ -96,107 +179,397 @@ def is_likely_reference_list(text: str) -> bool:
     if doi_count > 10: return True
     return False
 
-def run_extraction_cycle(storage: StorageService):
-    """Финальная версия: Агент, который "читает между строк"."""
+def extract_text_from_html(document: HtmlDocument) -> Optional[str]:
+    """План Б: извлекает основной текст страницы через readability."""
+    try:
+        final_html_text = document.readability_text()
+        if not is_likely_reference_list(final_html_text) and len(final_html_text) > 1500:
+            return final_html_text
+    except Exception as e:
+        print(f"    -> Ошибка при извлечении текста из HTML: {e}")
+    return None
+
+def parse_pdf_text(pdf_data: Union[bytes, memoryview], pdf_size: int) -> Tuple[Optional[str], bool]:
+    """Разбирает PDF и подставляет заглушку для 'картиночных' документов."""
+    pdf_text, is_image_pdf = parse_pdf_from_binary(pdf_data)
+    if pdf_text:
+        return pdf_text, False
+    if is_image_pdf:
+        return f"Image-based PDF, size: {pdf_size} bytes.", True
+    print("    -> Обнаружен PDF с проблемой кодировки текста. Текст не извлечен.")
+    return None, False
+
+def save_extraction_result(storage: StorageService, article, full_text: Optional[str], content_type: Optional[str],
+                           source_url: Optional[str], pdf_is_image_based: bool):
+    """Сохраняет результат извлечения и переводит статью на следующий этап конвейера."""
+    if full_text:
+        if pdf_is_image_based:
+            storage.update_article_text(article.id, full_text); storage.update_article_content(article.id, 'pdf_image_only', source_url); storage.update_article_status(article.id, 'image_pdf_extracted')
+            print(f"  ✅ 'Картиночный' PDF успешно сохранен. Статус -> image_pdf_extracted")
+        else:
+            cleaned_text, sections = segment_and_clean(full_text)
+            if len(cleaned_text) > 1500:
+                storage.update_article_text(article.id, cleaned_text, sections); storage.update_article_content(article.id, content_type, source_url); storage.update_article_status(article.id, 'awaiting_full_summary')
+                print(f"  ✅ Полный текст ({content_type}) успешно извлечен и сохранен. Статус -> awaiting_full_summary")
+            else:
+                storage.update_article_status(article.id, 'awaiting_abstract_summary'); print(f"  -> Извлеченный текст ({content_type}) оказался слишком коротким. Статус -> awaiting_abstract_summary")
+    elif article.original_abstract:
+        storage.update_article_status(article.id, 'awaiting_abstract_summary'); print("  -> Полный текст не найден. Используем аннотацию. Статус -> awaiting_abstract_summary")
+    else:
+        storage.update_article_status(article.id, 'extraction_failed'); print("  ❌ Не удалось извлечь контент, и нет аннотации. Статус -> extraction_failed")
+
+class ExtractionOutcome:
+    """
+    Результат поиска и разбора полного текста одной статьи,
+    а также ее бюджет времени и политика таймаутов по хостам.
+    """
+    def __init__(self, deadline: Optional[Deadline] = None, host_policy: Optional[HostTimeoutPolicy] = None,
+                 renderer=None):
+        self.deadline = deadline
+        self.host_policy = host_policy
+        self.renderer = renderer # Общий на цикл рендерер страниц (свой браузер или сервис рендеринга)
+        self.full_text = None
+        self.content_type = None
+        self.source_url = None
+        self.pdf_is_image_based = False
+        self.pdf_url = None
+        self.landing_url = None
+        self.last_html = None
+        self.last_document = None
+        self.last_url = None
+        self.hop_chain = []
+
+    @property
+    def deadline_at(self) -> Optional[float]:
+        return self.deadline.expires_at if self.deadline else None
+
+    def is_backed_off(self, url: str) -> bool:
+        return bool(self.host_policy and self.host_policy.backoff_until(url))
+
+    def check_host(self, url: str):
+        if self.host_policy:
+            self.host_policy.check(url)
+
+    def timeout_for(self, url: str) -> float:
+        """Таймаут запроса: адаптивный для хоста и не дольше остатка бюджета статьи."""
+        self.check_host(url)
+        limit = self.host_policy.timeout_for(url) if self.host_policy else REQUESTS_TIMEOUT
+        return self.deadline.timeout(limit) if self.deadline else limit
+
+    def record_latency(self, url: str, seconds: Optional[float]):
+        if self.host_policy and seconds is not None:
+            self.host_policy.record_latency(url, seconds)
+
+    def record_timeout(self, url: str):
+        """Учитывает таймаут; если хост из-за него ушел в отсрочку, бросает HostBackedOff."""
+        if self.host_policy:
+            self.host_policy.record_timeout(url)
+            self.host_policy.check(url)
+
+def store_and_parse_pdf(pdf: SpooledPdf, url: str, article, storage: StorageService, raw_cache: RawDocumentCache,
+                        outcome: ExtractionOutcome):
+    """Кладет скачанный PDF в кэш "сырых" документов и разбирает его."""
+    with pdf:
+        pdf_buffer = pdf.as_buffer()
+        raw_cache.put(pdf_buffer, pdf.sha256)
+        storage.update_article_raw_documents(article.id, pdf_sha256=pdf.sha256)
+        with extraction_metrics.stage('pdf_parse'):
+            outcome.full_text, outcome.pdf_is_image_based = parse_pdf_text(pdf_buffer, pdf.size)
+        del pdf_buffer # memoryview нужно отпустить до закрытия mmap
+    outcome.source_url, outcome.content_type, outcome.pdf_url = url, 'pdf', url
+
+def download_and_parse_pdf(url: str, article, storage: StorageService, raw_cache: RawDocumentCache,
+                           outcome: ExtractionOutcome) -> bool:
+    """Скачивает и разбирает PDF. Возвращает True, если PDF получен."""
+    timeout = outcome.timeout_for(url)
+    with extraction_metrics.stage('pdf_download'):
+        pdf, reason = download_pdf(url, headers={'User-Agent': USER_AGENT}, timeout=timeout,
+                                   min_size=MIN_PDF_SIZE_BYTES, deadline=outcome.deadline_at)
+    if not pdf:
+        print(f"    -> Не удалось скачать PDF ({reason}).")
+        if reason == TIMEOUT_REASON:
+            outcome.record_timeout(url)
+        if outcome.deadline:
+            outcome.deadline.check()
+        return False
+    outcome.record_latency(url, pdf.response_seconds)
+    store_and_parse_pdf(pdf, url, article, storage, raw_cache, outcome)
+    return True
+
+def get_open_access_pdf_urls(article, primary_url: str) -> List[str]:
+    """Все известные OA-копии PDF из метаданных статьи; primary_url идет первым."""
+    urls = [primary_url]
+    try:
+        metadata = json.loads(article.full_metadata or '{}')
+    except (TypeError, ValueError):
+        return urls
+    locations = [metadata.get('best_oa_location') or {}] + (metadata.get('locations') or [])
+    for location in locations:
+        pdf_url = (location or {}).get('pdf_url')
+        if pdf_url and location.get('is_oa') and pdf_url not in urls:
+            urls.append(pdf_url)
+    return urls
+
+def try_rewrite_rules(url: str, rewriter: UrlRewriter, article, storage: StorageService,
+                      raw_cache: RawDocumentCache, outcome: ExtractionOutcome) -> bool:
+    """Пробует получить PDF по правилам переписывания ссылок, без рендера страницы."""
+    timeout = outcome.timeout_for(url)
+    with extraction_metrics.stage('rewrite_rules'):
+        pdf_url = rewriter.find_pdf_url(url, timeout=timeout, deadline=outcome.deadline_at)
+    return bool(pdf_url) and download_and_parse_pdf(pdf_url, article, storage, raw_cache, outcome)
+
+def looks_like_pdf_url(url: str) -> bool:
+    return bool(DIRECT_PDF_URL_PATTERN.search(unquote(url)))
+
+def choose_extraction_route(article, url: str) -> str:
+    """
+    Выбирает обработчик по источнику, типу контента и форме URL:
+    'direct_pdf' — ссылка ведет прямо на файл, 'landing_page' — нужна навигация в браузере.
+    """
+    source_name = (article.source_name or '').lower()
+    if 'arxiv' in source_name and 'arxiv.org/pdf/' in url:
+        return 'direct_pdf'
+    if article.content_type == 'pdf' and url == article.content_url:
+        return 'direct_pdf' # OpenAlex/arXiv отдали pdf_url
+    if looks_like_pdf_url(url):
+        return 'direct_pdf'
+    return 'landing_page'
+
+def extract_direct_pdf(url: str, article, storage: StorageService, raw_cache: RawDocumentCache,
+                       rewriter: UrlRewriter, outcome: ExtractionOutcome):
+    """Скачивает PDF по прямой ссылке; если там оказалась страница, переходит к навигации."""
+    # Зеркала на отложенных хостах в гонку не берем; если отложены все, сработает проверка ниже
+    candidate_urls = [candidate for candidate in get_open_access_pdf_urls(article, url) if not outcome.is_backed_off(candidate)]
+    outcome.hop_chain.append(url)
+    if len(candidate_urls) > 1:
+        print(f"  [Прямая загрузка] Гонка между {len(candidate_urls)} OA-копиями...")
+        timeout = max(outcome.timeout_for(candidate) for candidate in candidate_urls)
+        with extraction_metrics.stage('pdf_download_hedged'):
+            pdf, winner_url, failures = download_first_pdf(candidate_urls, headers={'User-Agent': USER_AGENT},
+                                                           timeout=timeout, min_size=MIN_PDF_SIZE_BYTES,
+                                                           deadline=outcome.deadline_at)
+        for failed_url, reason in failures:
+            print(f"    -> Не удалось скачать PDF ({failed_url[:80]}: {reason}).")
+            if reason == TIMEOUT_REASON and outcome.host_policy:
+                outcome.host_policy.record_timeout(failed_url)
+        if pdf:
+            print(f"    -> Первым ответило зеркало: {winner_url[:90]}")
+            outcome.record_latency(winner_url, pdf.response_seconds)
+            store_and_parse_pdf(pdf, winner_url, article, storage, raw_cache, outcome)
+            return
+    else:
+        direct_url = candidate_urls[0] if candidate_urls else url
+        print(f"  [Прямая загрузка] {direct_url[:90]}...")
+        if download_and_parse_pdf(direct_url, article, storage, raw_cache, outcome):
+            return
+    print("    -> Прямая ссылка не дала PDF, открываю ее как страницу статьи.")
+    outcome.hop_chain.clear()
+    navigate_to_pdf(url, article, storage, raw_cache, rewriter, outcome, render_start_url=True)
+
+def navigate_to_pdf(start_url: str, article, storage: StorageService, raw_cache: RawDocumentCache,
+                    rewriter: UrlRewriter, outcome: ExtractionOutcome, render_start_url: bool = False):
+    """
+    Проходит по страницам в браузере (до MAX_NAVIGATION_HOPS), пока не найдет и не скачает PDF.
+    render_start_url=True заставляет открыть первый URL в браузере, даже если он похож на файл.
+    """
+    current_url = start_url
+    visited_urls = {current_url}
+    if try_rewrite_rules(current_url, rewriter, article, storage, raw_cache, outcome):
+        outcome.hop_chain.append(current_url)
+        return
+
+    # Без общего рендерера (ручной вызов) открываем свой на время навигации
+    with (nullcontext(outcome.renderer) if outcome.renderer else open_page_renderer()) as renderer:
+        for hop in range(MAX_NAVIGATION_HOPS):
+            print(f"  [Шаг {hop+1}] Анализирую: {current_url[:90]}...")
+            outcome.hop_chain.append(current_url)
+            try:
+                if looks_like_pdf_url(current_url) and not (hop == 0 and render_start_url):
+                    if not download_and_parse_pdf(current_url, article, storage, raw_cache, outcome):
+                        print("    -> Прекращаю попытки для этого URL.")
+                    break
+
+                timeout = outcome.timeout_for(current_url)
+                try:
+                    with extraction_metrics.stage('page_render'):
+                        rendered = renderer.render(current_url, timeout)
+                except RenderTimeout:
+                    print(f"    -> Страница не загрузилась за {timeout:.0f} сек.")
+                    outcome.record_timeout(current_url)
+                    raise
+                print(f"    -> Страница: {rendered.stats}")
+                outcome.record_latency(current_url, rendered.elapsed)
+                outcome.last_html, outcome.last_document = rendered.html, None
+                current_url = outcome.last_url = rendered.url
+                outcome.landing_url = outcome.landing_url or current_url
+                if current_url in visited_urls and hop > 0:
+                    print("    -> Обнаружен цикл, прекращаю навигацию."); break
+                visited_urls.add(current_url)
+
+                if try_rewrite_rules(current_url, rewriter, article, storage, raw_cache, outcome):
+                    break
+
+                outcome.last_document = HtmlDocument(outcome.last_html, current_url)
+                with extraction_metrics.stage('link_scoring'):
+                    best_link = find_best_pdf_link(outcome.last_document)
+
+                if best_link:
+                    print(f"    -> Найдена лучшая зацепка: {best_link[:90]}...")
+                    current_url = best_link
+                else:
+                    print("    -> Дальнейших зацепок не найдено.")
+                    break
+            except (DeadlineExceeded, HostBackedOff, RendererUnavailable):
+                raise
+            except Exception as e:
+                print(f"    -> Ошибка на шаге {hop+1}: {e}"); break
+
+EXTRACTION_ROUTES = {
+    'direct_pdf': extract_direct_pdf,
+    'landing_page': navigate_to_pdf,
+}
+
+def resolve_and_extract(start_url: str, article, storage: StorageService, raw_cache: RawDocumentCache,
+                        rewriter: UrlRewriter, outcome: ExtractionOutcome):
+    """Находит и разбирает PDF: сначала по кэшу разрешения ссылок, затем подходящим обработчиком."""
+    outcome.check_host(start_url)
+    navigation_start_url = start_url
+    with extraction_metrics.stage('resolution_cache'):
+        resolution = storage.get_url_resolution(start_url, max_age=URL_RESOLUTION_TTL)
+    if resolution:
+        print(f"  -> Маршрут известен из кэша разрешения ссылок (от {resolution.resolved_at:%Y-%m-%d}).")
+        if resolution.landing_url:
+            outcome.check_host(resolution.landing_url)
+        if resolution.pdf_url and download_and_parse_pdf(resolution.pdf_url, article, storage, raw_cache, outcome):
+            outcome.landing_url, outcome.hop_chain = resolution.landing_url, json.loads(resolution.hop_chain or '[]')
+        elif resolution.pdf_url:
+            print("    -> Закэшированная ссылка на PDF больше не работает, прохожу маршрут заново.")
+            storage.delete_url_resolution(start_url)
+        elif resolution.landing_url:
+            # PDF в прошлый раз не нашли, но редиректы DOI можно пропустить
+            navigation_start_url = resolution.landing_url
+
+    if not outcome.pdf_url:
+        route = choose_extraction_route(article, navigation_start_url)
+        EXTRACTION_ROUTES[route](navigation_start_url, article, storage, raw_cache, rewriter, outcome)
+        if outcome.landing_url or outcome.pdf_url:
+            storage.save_url_resolution(start_url, outcome.landing_url, outcome.pdf_url, outcome.hop_chain)
+
+def extract_article(article, storage: StorageService, raw_cache: RawDocumentCache, rewriter: UrlRewriter,
+                    host_policy: Optional[HostTimeoutPolicy] = None, renderer=None):
+    """Полный цикл извлечения одной статьи: кэш маршрутов, выбор обработчика, План Б и сохранение."""
+    storage.update_article_status(article.id, 'extraction_in_progress')
+    
+    start_url = article.content_url or (f"https://doi.org/{article.doi}" if article.doi else None)
+    if not start_url:
+        storage.update_article_status(article.id, 'awaiting_abstract_summary'); return
+
+    outcome = ExtractionOutcome(deadline=Deadline(ARTICLE_DEADLINE_SECONDS), host_policy=host_policy, renderer=renderer)
+    try:
+        resolve_and_extract(start_url, article, storage, raw_cache, rewriter, outcome)
+    except RendererUnavailable:
+        # Виновата не статья, а браузер: возвращаем ее в очередь как была
+        storage.update_article_status(article.id, article.status)
+        raise
+    except HostBackedOff as e:
+        deferrals = article.extraction_deferrals or 0
+        if deferrals < MAX_EXTRACTION_DEFERRALS:
+            storage.defer_article_extraction(article.id)
+            print(f"  -> {e}. Статья отложена до следующего прохода ({deferrals + 1}/{MAX_EXTRACTION_DEFERRALS}).")
+            return
+        print(f"  -> {e}, но статья откладывалась уже {deferrals} раз. Сохраняю то, что есть.")
+    except DeadlineExceeded as e:
+        print(f"  -> Общий бюджет времени на статью исчерпан ({e}). Сохраняю то, что успели получить.")
+    
+    if outcome.last_html:
+        html_sha256 = raw_cache.put(outcome.last_html.encode('utf-8'))
+        storage.update_article_raw_documents(article.id, html_sha256=html_sha256)
+
+    if not outcome.full_text and outcome.last_html:
+        print("  -> Поиск PDF не удался. Запускаю План Б: извлечение текста из HTML.")
+        # Обычно дерево уже построено при поиске ссылок; заново разбираем, только если навигация оборвалась раньше
+        document = outcome.last_document or HtmlDocument(outcome.last_html, outcome.last_url)
+        with extraction_metrics.stage('html_fallback'):
+            html_text = extract_text_from_html(document)
+        if html_text:
+            outcome.full_text, outcome.source_url, outcome.content_type = html_text, outcome.last_url, 'html'
+            print("    -> Успех! Извлечен полный текст из HTML.")
+
+    save_extraction_result(storage, article, outcome.full_text, outcome.content_type, outcome.source_url, outcome.pdf_is_image_based)
+    if article.extraction_deferrals:
+        # Попытка завершена: прошлые отсрочки не должны сокращать лимит при следующем извлечении
+        storage.reset_extraction_deferrals(article.id)
+
+def run_extraction_cycle(storage: StorageService, pause_range: Tuple[float, float] = PAUSE_BETWEEN_ARTICLES,
+                         raw_cache: Optional[RawDocumentCache] = None):
+    """Финальная версия: Агент, который "читает между строк". raw_cache — свой кэш сырых документов (бенчмарк)."""
     print("=== ЗАПУСК АГЕНТА-ЭКСТРАКТОРА (v4 - с поиском в мета-тегах) ===")
     articles_to_process = storage.get_articles_by_status('new', limit=1000)
 
     if not articles_to_process:
         print("...статей для извлечения контента не найдено."); return
 
+    raw_cache = raw_cache or RawDocumentCache()
+    rewriter = UrlRewriter(storage, headers={'User-Agent': USER_AGENT}, timeout=REQUESTS_TIMEOUT)
+    host_policy = HostTimeoutPolicy(storage, max_timeout=REQUESTS_TIMEOUT)
     print(f"Найдено {len(articles_to_process)} статей для обработки.")
-    for i, article in enumerate(articles_to_process):
-        print(f"\n[{i+1}/{len(articles_to_process)}] Обрабатываю: {article.title[:50]}...")
-        storage.update_article_status(article.id, 'extraction_in_progress')
-        
-        full_text, source_of_truth_url, pdf_is_image_based = None, None, False
-        last_visited_html = None
-        
-        start_url = article.content_url or (f"https://doi.org/{article.doi}" if article.doi else None)
-        if not start_url:
-            storage.update_article_status(article.id, 'awaiting_abstract_summary'); continue
-        
-        current_url = start_url
-        visited_urls = {current_url}
-        
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            for hop in range(MAX_NAVIGATION_HOPS):
-                print(f"  [Шаг {hop+1}] Анализирую: {current_url[:90]}...")
-                try:
-                    if any(kw in current_url.lower() for kw in ['download', '.pdf']):
-                        response = requests.get(current_url, headers={'User-Agent': USER_AGENT}, timeout=REQUESTS_TIMEOUT)
-                        if response.status_code == 200 and len(response.content) > MIN_PDF_SIZE_BYTES:
-                            pdf_text, is_image_pdf = parse_pdf_from_binary(response.content)
-                            if pdf_text:
-                                full_text, pdf_is_image_based = pdf_text, False
-                            elif is_image_pdf:
-                                full_text, pdf_is_image_based = f"Image-based PDF, size: {len(response.content)} bytes.", True
-                            else:
-                                print("    -> Обнаружен PDF с проблемой кодировки текста. Текст не извлечен.")
-                                full_text = None
-                            source_of_truth_url = current_url
-                            break
-                        else:
-                            print("    -> Не удалось скачать PDF через requests. Прекращаю попытки для этого URL.")
-                            break
-                    
-                    page.goto(current_url, timeout=REQUESTS_TIMEOUT*1000, wait_until='domcontentloaded')
-                    last_visited_html = page.content()
-                    current_url = page.url
-                    if current_url in visited_urls and hop > 0:
-                        print("    -> Обнаружен цикл, прекращаю навигацию."); break
-                    visited_urls.add(current_url)
-
-                    soup = BeautifulSoup(last_visited_html, 'html.parser')
-                    best_link = find_best_pdf_link(soup, current_url)
-                    
-                    if best_link:
-                        print(f"    -> Найдена лучшая зацепка: {best_link[:90]}...")
-                        current_url = best_link
-                    else:
-                        print("    -> Дальнейших зацепок не найдено.")
-                        break
-                except Exception as e:
-                    print(f"    -> Ошибка на шаге {hop+1}: {e}"); break
-        
-        if not full_text and last_visited_html:
-            print("  -> Поиск PDF не удался. Запускаю План Б: извлечение текста из HTML.")
+    # Один браузер (или клиент сервиса рендеринга) на весь цикл; запускается, только если понадобится
+    with open_page_renderer() as renderer:
+        for i, article in enumerate(articles_to_process):
+            print(f"\n[{i+1}/{len(articles_to_process)}] Обрабатываю: {article.title[:50]}...")
             try:
-                doc = Document(last_visited_html)
-                html_article_text = doc.summary()
-                soup = BeautifulSoup(html_article_text, 'html.parser')
-                final_html_text = soup.get_text(separator='\n', strip=True)
-                
-                if not is_likely_reference_list(final_html_text) and len(final_html_text) > 1500:
-                    full_text = final_html_text; source_of_truth_url = current_url
-                    print("    -> Успех! Извлечен полный текст из HTML.")
-            except Exception as e:
-                print(f"    -> Ошибка при извлечении текста из HTML: {e}")
-
-        if full_text:
-            if pdf_is_image_based:
-                storage.update_article_text(article.id, full_text); storage.update_article_content(article.id, 'pdf_image_only', source_of_truth_url); storage.update_article_status(article.id, 'image_pdf_extracted')
-                print(f"  ✅ 'Картиночный' PDF успешно сохранен. Статус -> image_pdf_extracted")
-            else:
-                content_type = 'html' if source_of_truth_url == current_url else 'pdf'
-                cleaned_text = cleanup_text(full_text)
-                if len(cleaned_text) > 1500:
-                    storage.update_article_text(article.id, cleaned_text); storage.update_article_content(article.id, content_type, source_of_truth_url); storage.update_article_status(article.id, 'awaiting_full_summary')
-                    print(f"  ✅ Полный текст ({content_type}) успешно извлечен и сохранен. Статус -> awaiting_full_summary")
-                else:
-                    storage.update_article_status(article.id, 'awaiting_abstract_summary'); print(f"  -> Извлеченный текст ({content_type}) оказался слишком коротким. Статус -> awaiting_abstract_summary")
-        elif article.original_abstract:
-            storage.update_article_status(article.id, 'awaiting_abstract_summary'); print("  -> Полный текст не найден. Используем аннотацию. Статус -> awaiting_abstract_summary")
-        else:
-            storage.update_article_status(article.id, 'extraction_failed'); print("  ❌ Не удалось извлечь контент, и нет аннотации. Статус -> extraction_failed")
+                with extraction_metrics.stage('article_total'):
+                    extract_article(article, storage, raw_cache, rewriter, host_policy, renderer)
+            except RendererUnavailable as e:
+                print(f"\n❌ Рендеринг страниц недоступен ({e}). Цикл остановлен, "
+                      f"оставшиеся {len(articles_to_process) - i} статей дождутся следующего запуска.")
+                break
+            extraction_metrics.increment('articles')
 
-        if i < len(articles_to_process) - 1:
-            sleep_time = random.uniform(2, 5); print(f"   ...пауза на {sleep_time:.1f} сек..."); time.sleep(sleep_time)
+            if i < len(articles_to_process) - 1 and pause_range[1] > 0:
+                sleep_time = random.uniform(*pause_range); print(f"   ...пауза на {sleep_time:.1f} сек..."); time.sleep(sleep_time)
 
+        if renderer.summary():
+            print(f"\n-> Браузер: {renderer.summary()}")
+    get_http_client().print_host_stats()
     print("\n=== РАБОТА АГЕНТА-ЭКСТРАКТОРА ЗАВЕРШЕНА ===")
 
+def run_reextraction_cycle(storage: StorageService, statuses: List[str] = REEXTRACTION_STATUSES, limit: int = 1000):
+    """
+    Повторно извлекает текст из закэшированных "сырых" документов без обращения к сети.
+    Нужен, когда улучшены разбор PDF, сегментация разделов или извлечение из HTML.
+    """
+    print("=== ЗАПУСК ПОВТОРНОГО ИЗВЛЕЧЕНИЯ ИЗ КЭША ===")
+    articles = storage.get_articles_with_raw_documents(statuses, limit=limit)
+    if not articles:
+        print("...статей с закэшированными документами не найдено."); return
+
+    raw_cache = RawDocumentCache()
+    print(f"Найдено {len(articles)} статей с закэшированными документами.")
+    for i, article in enumerate(articles):
+        print(f"\n[{i+1}/{len(articles)}] Переизвлекаю: {article.title[:50]}... (Статус: {article.status})")
+        full_text, content_type, pdf_is_image_based = None, None, False
+
+        pdf_path = raw_cache.get_path(article.raw_pdf_sha256)
+        html_path = raw_cache.get_path(article.raw_html_sha256)
+        if not (pdf_path or html_path):
+            print("  -> Документы статьи уже вытеснены из кэша. Пропускаю."); continue
+
+        if pdf_path:
+            pdf_data = pdf_path.read_bytes()
+            full_text, pdf_is_image_based = parse_pdf_text(pdf_data, len(pdf_data))
+            content_type = 'pdf'
+            if pdf_is_image_based and article.content_type == 'pdf_ocr':
+                # Текст уже распознан OCR-агентом; заглушка "картиночного" PDF его бы затерла
+                print("  -> PDF по-прежнему без текстового слоя, оставляю распознанный OCR текст."); continue
+        if not full_text and html_path:
+            html_text = extract_text_from_html(HtmlDocument(html_path.read_text(encoding='utf-8', errors='replace'), article.content_url))
+            if html_text:
+                full_text, content_type = html_text, 'html'
+
+        save_extraction_result(storage, article, full_text, content_type, article.content_url, pdf_is_image_based)
+
+    print("\n=== ПОВТОРНОЕ ИЗВЛЕЧЕНИЕ ЗАВЕРШЕНО ===")
+
 if __name__ == "__main__":
     storage_instance = StorageService(); run_extraction_cycle(storage_instance)
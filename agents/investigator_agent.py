@@ -14,53 +14,43 @@ from dotenv import load_dotenv
 dotenv_path = project_root / '.env'
 load_dotenv(dotenv_path=dotenv_path)
 
-# --- Используем Playwright ---
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+# --- Страницы рендерит свой браузер или общий сервис рендеринга (RENDER_SERVICE_URL) ---
 from bs4 import BeautifulSoup
 from services.storage_service import StorageService
+from services.page_renderer import open_page_renderer, RenderTimeout
 
 def find_pdf_link_with_browser(page_url: str) -> str | None:
     """
-    Заходит на страницу, используя Playwright, и ищет ссылку на PDF.
+    Открывает страницу в браузере и ищет ссылку на PDF.
     """
-    with sync_playwright() as p:
-        browser = None
-        try:
-            launch_args = ['--disable-blink-features=AutomationControlled']
-            browser = p.chromium.launch(headless=True, args=launch_args)
-            
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            )
-            page = context.new_page()
-            
-            page.goto(page_url, timeout=60000, wait_until='domcontentloaded')
-            time.sleep(5) 
-            html_content = page.content()
+    try:
+        with open_page_renderer(
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            launch_args=['--disable-blink-features=AutomationControlled'],
+        ) as renderer:
+            # 5 секунд на догрузку скриптов страницы
+            page = renderer.render(page_url, timeout=60, settle_ms=5000)
+    except RenderTimeout:
+        print(f"    -> Ошибка: Страница {page_url} не загрузилась за 60 секунд.")
+        return None
+    except Exception as e:
+        print(f"    -> Неожиданная ошибка при рендеринге страницы: {e}")
+        return None
 
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Ищем ссылки, которые явно ведут на .pdf
-            pdf_links = soup.find_all('a', href=re.compile(r'\.pdf$', re.I))
-            if not pdf_links:
-                # Если не нашли, ищем по тексту ссылки
-                pdf_links = soup.find_all('a', string=re.compile(r'.*(pdf|download|full.?text).*', re.I))
+    soup = BeautifulSoup(page.html, 'html.parser')
+
+    # Ищем ссылки, которые явно ведут на .pdf
+    pdf_links = soup.find_all('a', href=re.compile(r'\.pdf$', re.I))
+    if not pdf_links:
+        # Если не нашли, ищем по тексту ссылки
+        pdf_links = soup.find_all('a', string=re.compile(r'.*(pdf|download|full.?text).*', re.I))
+
+    for link in pdf_links:
+        href = link.get('href')
+        if href and not href.startswith('javascript:'):
+            return urljoin(page.url, href)
 
-            for link in pdf_links:
-                href = link.get('href')
-                if href and not href.startswith('javascript:'):
-                    return urljoin(page_url, href)
-                        
-            return None
-        except PlaywrightTimeoutError:
-            print(f"    -> Ошибка: Страница {page_url} не загрузилась за 60 секунд.")
-            return None
-        except Exception as e:
-            print(f"    -> Неожиданная ошибка при работе с Playwright: {e}")
-            return None
-        finally:
-            if browser:
-                browser.close()
+    return None
 
 # --- НОВАЯ ГЛАВНАЯ ФУНКЦИЯ ДЛЯ ОРКЕСТРАТОРА ---
 def run_investigation_cycle(storage: StorageService):
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+# --- Блок инициализации ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.storage_service import StorageService
+from services.raw_document_cache import RawDocumentCache
+from services.pdf_downloader import download_pdf
+from services.section_segmenter import segment_and_clean
+
+# --- Константы ---
+TESSERACT_CMD = os.getenv('TESSERACT_CMD', 'tesseract')
+OCR_LANGUAGES = os.getenv('OCR_LANGUAGES', 'eng+rus')
+OCR_DPI = int(os.getenv('OCR_DPI', 300))
+OCR_MAX_PAGES = int(os.getenv('OCR_MAX_PAGES', 30)) # Бюджет страниц на одну статью
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+OCR_PAGE_TIMEOUT = 120 # сек на одну страницу
+# Ранняя остановка: если на первых страницах почти нет текста, это не скан статьи (схемы, фото, пустые листы)
+OCR_DENSITY_PROBE_PAGES = 3
+OCR_MIN_CHARS_PER_PAGE = int(os.getenv('OCR_MIN_CHARS_PER_PAGE', 300))
+MIN_FULL_TEXT_CHARS = 1500 # Тот же порог, что и у экстрактора
+REQUESTS_TIMEOUT = 30
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
+# Сообщения Tesseract о сломанной установке (нет языковых данных), а не о плохой странице
+TESSERACT_SETUP_ERRORS = ('Failed loading language', 'Error opening data file', 'TESSDATA_PREFIX')
+
+class OcrUnavailable(Exception):
+    """Tesseract не может работать вообще (не запускается, нет языковых данных): статья тут ни при чем."""
+
+def ocr_page(pdf_path: str, page_index: int, dpi: int = OCR_DPI, languages: str = OCR_LANGUAGES) -> str:
+    """
+    Растеризует одну страницу и распознает ее Tesseract'ом. Выполняется в дочернем процессе:
+    каждый процесс сам открывает файл, поэтому между процессами передается только путь.
+    """
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[page_index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = pixmap.tobytes("png")
+    # Параллелим по страницам, поэтому внутренние потоки Tesseract только мешают
+    env = dict(os.environ, OMP_THREAD_LIMIT='1')
+    try:
+        result = subprocess.run([TESSERACT_CMD, 'stdin', 'stdout', '-l', languages],
+                                input=image, capture_output=True, timeout=OCR_PAGE_TIMEOUT, env=env)
+    except OSError as e:
+        raise OcrUnavailable(f"Tesseract не запускается: {e}")
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', errors='replace').strip()
+        if any(marker in message for marker in TESSERACT_SETUP_ERRORS):
+            raise OcrUnavailable(message[:200])
+        raise RuntimeError(message[:200])
+    return result.stdout.decode('utf-8', errors='replace')
+
+def ocr_pdf(pdf_path: str, executor: ProcessPoolExecutor, workers: int) -> Tuple[str, int]:
+    """
+    Распознает PDF постранично волнами по `workers` страниц.
+    Останавливается по бюджету OCR_MAX_PAGES или если после первых
+    OCR_DENSITY_PROBE_PAGES страниц плотность текста ниже порога.
+    Возвращает (текст, число распознанных страниц).
+    """
+    with fitz.open(pdf_path) as doc:
+        page_budget = min(doc.page_count, OCR_MAX_PAGES)
+    pages: List[str] = []
+    # Первая волна не больше пробы плотности, чтобы не тратить CPU на заведомо пустой документ
+    wave_size, density_checked = min(workers, OCR_DENSITY_PROBE_PAGES), False
+    while len(pages) < page_budget:
+        wave = range(len(pages), min(page_budget, len(pages) + wave_size))
+        pages.extend(executor.map(ocr_page, [pdf_path] * len(wave), wave))
+        wave_size = workers
+        if not density_checked and len(pages) >= min(OCR_DENSITY_PROBE_PAGES, page_budget):
+            density_checked = True
+            density = sum(len(page.strip()) for page in pages) / len(pages)
+            if density < OCR_MIN_CHARS_PER_PAGE:
+                print(f"    -> На первых {len(pages)} стр. в среднем {density:.0f} символов, это не текстовый скан. Останавливаюсь.")
+                return "", len(pages)
+    return "\n".join(pages).strip(), len(pages)
+
+def materialize_pdf(article, raw_cache: RawDocumentCache, tmp_dir: str) -> Optional[str]:
+    """Путь к PDF статьи: из кэша "сырых" документов или заново скачанный во временную папку."""
+    cached_path = raw_cache.get_path(article.raw_pdf_sha256)
+    if cached_path:
+        return str(cached_path)
+    if not article.content_url:
+        return None
+    print(f"  -> PDF нет в кэше, скачиваю заново: {article.content_url[:90]}")
+    pdf, reason = download_pdf(article.content_url, headers={'User-Agent': USER_AGENT}, timeout=REQUESTS_TIMEOUT)
+    if not pdf:
+        print(f"    -> Не удалось скачать PDF ({reason}).")
+        return None
+    path = os.path.join(tmp_dir, f"{article.id}.pdf")
+    with pdf, open(path, 'wb') as f:
+        buffer = pdf.as_buffer()
+        f.write(buffer)
+        del buffer # memoryview нужно отпустить до закрытия mmap
+    return path
+
+def run_ocr_cycle(storage: StorageService, limit: int = 50, workers: int = OCR_WORKERS):
+    """
+    Распознает "картиночные" PDF (статус image_pdf_extracted) и отправляет
+    удачные на полную суммаризацию. Работает отдельной задачей, не задерживая экстрактор.
+    """
+    print("=== ЗАПУСК АГЕНТА-РАСПОЗНАВАТЕЛЯ (OCR) ===")
+    if not shutil.which(TESSERACT_CMD):
+        print(f"...Tesseract ('{TESSERACT_CMD}') не найден, OCR пропущен."); return
+
+    articles = storage.get_articles_by_status('image_pdf_extracted', limit=limit)
+    if not articles:
+        print("...картиночных PDF для распознавания не найдено."); return
+
+    raw_cache = RawDocumentCache()
+    print(f"Найдено {len(articles)} PDF без текстового слоя. Процессов OCR: {workers}.")
+    with ProcessPoolExecutor(max_workers=workers) as executor, tempfile.TemporaryDirectory(prefix='curious_ocr_') as tmp_dir:
+        for i, article in enumerate(articles):
+            print(f"\n[{i+1}/{len(articles)}] Распознаю: {article.title[:50]}...")
+            storage.update_article_status(article.id, 'ocr_in_progress')
+            text = ""
+            try:
+                pdf_path = materialize_pdf(article, raw_cache, tmp_dir)
+                if pdf_path:
+                    text, pages_done = ocr_pdf(pdf_path, executor, workers)
+                    print(f"  -> Распознано страниц: {pages_done}, символов: {len(text)}")
+            except (OcrUnavailable, BrokenProcessPool) as e:
+                # Сломан сам OCR: статья и все следующие дождутся исправления, статусы не портим
+                storage.update_article_status(article.id, 'image_pdf_extracted')
+                print(f"  ❌ OCR недоступен ({type(e).__name__}: {e}). Цикл остановлен, статьи остаются в очереди.")
+                break
+            except subprocess.TimeoutExpired:
+                storage.update_article_status(article.id, 'image_pdf_extracted')
+                print(f"  -> Tesseract не уложился в {OCR_PAGE_TIMEOUT} сек на страницу. Статья остается в очереди.")
+                continue
+            except Exception as e:
+                print(f"  -> Ошибка OCR: {e}")
+
+            cleaned_text, sections = segment_and_clean(text)
+            if len(cleaned_text) > MIN_FULL_TEXT_CHARS:
+                storage.update_article_text(article.id, cleaned_text, sections)
+                storage.update_article_content(article.id, 'pdf_ocr', article.content_url)
+                storage.update_article_status(article.id, 'awaiting_full_summary')
+                print("  ✅ Текст распознан. Статус -> awaiting_full_summary")
+            elif article.original_abstract:
+                storage.update_article_status(article.id, 'awaiting_abstract_summary')
+                print("  -> Распознать текст не удалось. Используем аннотацию. Статус -> awaiting_abstract_summary")
+            else:
+                storage.update_article_status(article.id, 'ocr_failed')
+                print("  ❌ Распознать текст не удалось, и нет аннотации. Статус -> ocr_failed")
+
+    print("\n=== РАБОТА АГЕНТА-РАСПОЗНАВАТЕЛЯ ЗАВЕРШЕНА ===")
+
+if __name__ == "__main__":
+    storage_instance = StorageService(); run_ocr_cycle(storage_instance)
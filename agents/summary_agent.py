@@ -4,7 +4,10 @@ import os
 import sys
 import time
 import re
+import hashlib
+from collections import Counter
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, CancelledError, wait, FIRST_COMPLETED
 
 # --- Блок инициализации ---
 project_root = Path(__file__).resolve().parent.parent
@@ -15,34 +18,154 @@ load_dotenv(dotenv_path=dotenv_path)
 
 # --- Импорты наших модулей ---
 from services.storage_service import StorageService
-from services.giga_service import GigaService
+from services.giga_service import GigaService, RetriesExhausted, circuit_breaker, completion_metrics
+from services.circuit_breaker import CircuitOpen
+from services.completion_cache import CompletionCache, LLM_CACHE_ENABLED
+from services.llm_telemetry import LlmTelemetry
+from services.text_chunker import estimate_tokens, split_into_chunks
+from services.extractive_compressor import compress_text, load_slice_keywords
+from services.extraction_metrics import StageMetrics
+from services.section_segmenter import segment_and_clean, sections_from_json, select_sections
+from services.summary_scheduler import schedule_summaries
+
+# --- Константы ---
+# Сколько запросов к GigaChat держим в полете; темп сверху ограничивает лимитер GigaService
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', 4))
+# Тексты до этого бюджета суммаризируются одним запросом, длиннее — через map-reduce по кускам
+SINGLE_SHOT_TOKEN_BUDGET = int(os.getenv('SUMMARY_SINGLE_SHOT_TOKENS', 6000))
+CHUNK_TOKEN_BUDGET = int(os.getenv('SUMMARY_CHUNK_TOKENS', 2500))
+MAX_SUMMARY_CHUNKS = int(os.getenv('SUMMARY_MAX_CHUNKS', 12)) # Потолок запросов на одну статью
+CHUNK_SUMMARY_MAX_TOKENS = 400
+CHUNK_BUDGET_STEP = 1.1 # Во сколько раз укрупняются куски, если их больше MAX_SUMMARY_CHUNKS
+# Потолок длины новостной заметки: ответ читается потоком и обрывается на границе предложения (0 — без потока)
+SUMMARY_MAX_CHARS = int(os.getenv('SUMMARY_MAX_CHARS', 1500))
+# Экстрактивное сжатие полных текстов перед LLM: ab (половина статей по хэшу id сжимается, для сравнения веток), on или off.
+# Сжатый текст всегда помещается в SINGLE_SHOT_TOKEN_BUDGET, так что в ветке compressed map-reduce не нужен
+SUMMARY_COMPRESSION = os.getenv('SUMMARY_COMPRESSION', 'ab').lower()
+# Разделы, из которых выбирает сжатие: обзор литературы и детали методики в новостную заметку не попадают
+COMPRESSION_SECTION_TYPES = ('front', 'abstract', 'introduction', 'results', 'discussion', 'conclusion', 'body')
+# Аннотации отправляются пачками в один запрос; 1 — по одной, как раньше
+ABSTRACT_BATCH_SIZE = int(os.getenv('SUMMARY_ABSTRACT_BATCH_SIZE', 6))
+ABSTRACT_MAX_TOKENS_PER_ITEM = 400
+MIN_BATCH_ITEM_CHARS = 80 # Более короткий пересказ из пачки считаем неразобранным
+BATCH_ITEM_MARKER = re.compile(r'^[ \t*#]*=+[ \t]*ПОСТ[ \t]*\[?(\d+)\]?[ \t]*=+[ \t*]*$', re.MULTILINE | re.IGNORECASE)
+
+def compression_arm(article_id: str, mode: str = SUMMARY_COMPRESSION) -> str:
+    """Ветка эксперимента для полного текста: 'compressed' или 'full'. В режиме ab — стабильно по id статьи."""
+    if mode == 'ab':
+        return 'compressed' if hashlib.sha1(article_id.encode('utf-8')).digest()[0] % 2 else 'full'
+    return 'compressed' if mode == 'on' else 'full'
+
+def _timed_completion(giga: GigaService, metrics: StageMetrics, arm: str, prompt: str, **kwargs):
+    """Выполняется в пуле потоков: вызов GigaChat с учетом времени и (оценочных) токенов промпта по ветке."""
+    metrics.increment(f"prompt_tokens_{arm}", estimate_tokens(prompt))
+    with metrics.stage(f"llm_{arm}"):
+        return giga.get_completion(prompt, **kwargs)
+
+def print_stream_report():
+    summary = completion_metrics.summary()
+    ttft, total = summary['stages'].get('llm_ttft'), summary['stages'].get('llm_stream_total')
+    if not total: return
+    ttft_text = f"до первого токена p50 {ttft['p50_ms'] / 1000:.1f} с, p95 {ttft['p95_ms'] / 1000:.1f} с; " if ttft else ""
+    print(f"--- Потоковые ответы: {total['count']}, {ttft_text}полностью p50 {total['p50_ms'] / 1000:.1f} с, "
+          f"p95 {total['p95_ms'] / 1000:.1f} с; обрезано по лимиту {SUMMARY_MAX_CHARS} символов: "
+          f"{summary['counters'].get('streams_cut', 0)} ---")
+
+def print_arm_report(metrics: StageMetrics):
+    summary = metrics.summary()
+    stages, counters = summary['stages'], summary['counters']
+    if not stages: return
+    print("--- Вызовы GigaChat по веткам ---")
+    for arm in ('full', 'compressed', 'abstract', 'abstract_batch'):
+        stage = stages.get(f"llm_{arm}")
+        if not stage: continue
+        articles = counters.get(f"articles_{arm}", 0)
+        tokens = counters.get(f"prompt_tokens_{arm}", 0)
+        per_article = f" (~{tokens // articles} на статью)" if articles else ""
+        print(f"  {arm}: статей {articles}, вызовов {stage['count']}, p50 {stage['p50_ms'] / 1000:.1f} с, "
+              f"p95 {stage['p95_ms'] / 1000:.1f} с, токенов промпта ~{tokens}{per_article}")
+
+def print_schedule_report(queue: list, scheduled: list, review_depth: dict):
+    """По темам: ждут выжимки / уже у модераторов / берем в этот цикл (первой идет тема, взятая первой)."""
+    waiting, taken = Counter(item.theme_name for item in queue), Counter(item.theme_name for item in scheduled)
+    themes = list(dict.fromkeys(item.theme_name for item in scheduled)) + [theme for theme in waiting if theme not in taken]
+    print("--- План суммаризации по темам (ждут / на модерации / в цикле) ---")
+    for theme in themes:
+        print(f"  {theme or 'Общие финансы'}: {waiting[theme]} / {review_depth.get(theme, 0)} / {taken[theme]}")
+
+def build_abstract_batch(template: str, items: list) -> str:
+    """Промпт для пачки аннотаций; каждая помечена коротким номером, по которому разбирается ответ."""
+    blocks = [
+        f"=== АННОТАЦИЯ [{tag}] ===\nТЕМА: {article.theme_name or 'Общие финансы'}\n{article.original_abstract.strip()}"
+        for tag, article, _ in items
+    ]
+    return template.format(articles_block="\n\n".join(blocks), articles_count=len(items))
+
+def parse_abstract_batch(response: str, tags: list) -> dict:
+    """
+    Разбирает ответ на пачку: {номер: пересказ}. Номера, которых нет в ответе,
+    которые повторяются или с подозрительно коротким текстом, в результат не попадают.
+    """
+    if not response:
+        return {}
+    markers = list(BATCH_ITEM_MARKER.finditer(response))
+    parsed, seen = {}, set()
+    for i, marker in enumerate(markers):
+        tag = int(marker.group(1))
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(response)
+        text = response[marker.end():end].strip()
+        if tag in seen:
+            parsed.pop(tag, None); continue
+        seen.add(tag)
+        if tag in tags and len(text) >= MIN_BATCH_ITEM_CHARS:
+            parsed[tag] = text
+    return parsed
+
+def plan_chunks(text: str) -> list:
+    """
+    Делит длинный текст на куски для map-фазы. Если кусков по CHUNK_TOKEN_BUDGET
+    больше MAX_SUMMARY_CHUNKS, куски укрупняются (но не больше SINGLE_SHOT_TOKEN_BUDGET),
+    и только если и так не помещается, хвост статьи отбрасывается.
+    """
+    budget = min(max(CHUNK_TOKEN_BUDGET, -(-estimate_tokens(text) // MAX_SUMMARY_CHUNKS)), SINGLE_SHOT_TOKEN_BUDGET)
+    chunks = split_into_chunks(text, budget)
+    # Жадная упаковка оставляет куски недозаполненными: бюджет растет ступенями, пока куски не поместятся
+    while len(chunks) > MAX_SUMMARY_CHUNKS and budget < SINGLE_SHOT_TOKEN_BUDGET:
+        budget = min(int(budget * CHUNK_BUDGET_STEP) + 1, SINGLE_SHOT_TOKEN_BUDGET)
+        chunks = split_into_chunks(text, budget)
+    if len(chunks) > MAX_SUMMARY_CHUNKS:
+        print(f"  -> Текст длиннее {MAX_SUMMARY_CHUNKS} кусков, хвост ({len(chunks) - MAX_SUMMARY_CHUNKS} кусков) отброшен.")
+    return chunks[:MAX_SUMMARY_CHUNKS]
 
 # --- УТИЛИТАРНАЯ ФУНКЦИЯ ---
 def cleanup_text(text: str) -> str:
-    """Отсекает "хвост" из ссылок и прочего мусора."""
-    if not text:
-        return ""
-    stop_words = [
-        'References', 'Bibliography', 'Data availability statement',
-        'Ethics statement', 'Author contributions', 'Funding',
-        'Conflict of interest', 'Supplementary material', 'Publisher’s note'
-    ]
-    pattern = re.compile(r'\b(' + '|'.join(stop_words) + r')\b', re.IGNORECASE)
-    match = pattern.search(text)
-    
-    if match:
-        return text[:match.start()]
-    return text
+    """Отсекает "хвост" из ссылок и прочего мусора (разделы back matter, см. section_segmenter)."""
+    return segment_and_clean(text)[0]
 
 # --- НОВАЯ ГЛАВНАЯ ФУНКЦИЯ ДЛЯ ОРКЕСТРАТОРА ---
-def run_summary_cycle(storage: StorageService):
+def run_summary_cycle(storage: StorageService, concurrency: int = SUMMARY_CONCURRENCY):
     """
-    Запускается "Дирижером", обрабатывает ВСЕ статьи, ожидающие суммаризации,
-    и завершает свою работу.
+    Запускается "Дирижером", обрабатывает статьи, ожидающие суммаризации,
+    и завершает свою работу. За цикл — до SUMMARY_CYCLE_LIMIT статей в порядке summary_scheduler.
+    Запросы к GigaChat идут параллельно (до concurrency
+    одновременно), а все записи в БД делает только основной поток.
+    Тексты длиннее SINGLE_SHOT_TOKEN_BUDGET идут через map-reduce: выжимки
+    кусков, затем сведение их новостным промптом.
     """
     print("=== ЗАПУСК АГЕНТА-СУММАРИЗАТОРА ===")
     # storage = StorageService()
-    giga = GigaService()
+    if circuit_breaker.is_open:
+        print("...GigaChat недавно был недоступен, суммаризация пропущена до следующего цикла.")
+        print("=== РАБОТА АГЕНТА-СУММАРИЗАТОРА ЗАВЕРШЕНА ===")
+        return
+    # Общий клиент GigaChat: заодно проверяем креды до запуска пула, чтобы упасть сразу и понятно
+    cache = CompletionCache(storage) if LLM_CACHE_ENABLED else None
+    telemetry = LlmTelemetry(storage)
+    giga = GigaService(cache=cache, telemetry=telemetry)
+    metrics = StageMetrics()
+    completion_metrics.reset()
+    news_limits = {'max_chars': SUMMARY_MAX_CHARS} if SUMMARY_MAX_CHARS > 0 else {}
+    slice_keywords = load_slice_keywords(project_root / 'sources') if SUMMARY_COMPRESSION != 'off' else {}
 
     # Загружаем шаблоны промптов
     prompt_dir = project_root / 'prompts'
@@ -51,45 +174,31 @@ def run_summary_cycle(storage: StorageService):
             full_summary_prompt = f.read()
         with open(prompt_dir / 'summary_abstract_style_prompt.txt', 'r', encoding='utf-8') as f:
             abstract_summary_prompt = f.read()
+        with open(prompt_dir / 'summary_chunk_prompt.txt', 'r', encoding='utf-8') as f:
+            chunk_summary_prompt = f.read()
+        with open(prompt_dir / 'summary_abstract_batch_prompt.txt', 'r', encoding='utf-8') as f:
+            abstract_batch_prompt = f.read()
     except FileNotFoundError as e:
         print(f"КРИТИЧЕСКАЯ ОШИБКА: Не найден файл с промптом: {e}")
         return
     
     statuses_to_find = ['awaiting_full_summary', 'awaiting_abstract_summary']
-    articles_to_process = storage.get_articles_by_status(statuses_to_find, limit=1000)
-        
-    if not articles_to_process:
+    queue = storage.get_article_queue(statuses_to_find)
+    if not queue:
         print("...статей для суммаризации не найдено.")
         print("=== РАБОТА АГЕНТА-СУММАРИЗАТОРА ЗАВЕРШЕНА ===")
         return
 
-    print(f"Найдено {len(articles_to_process)} статей для суммаризации. Начинаю обработку...")
-
-    for article in articles_to_process:
-        print(f"\n-> Обрабатываю статью: {article.title[:60]}... (Статус: {article.status})")
-        
-        theme = article.theme_name or "Общие финансы"
-        
-        if article.status == 'awaiting_full_summary':
-            prompt_template = full_summary_prompt
-            text_to_process = article.full_text
-        else: # awaiting_abstract_summary
-            prompt_template = abstract_summary_prompt
-            text_to_process = article.original_abstract
-
-        if not text_to_process or len(text_to_process) < 50:
-            print("  -> Текст отсутствует или слишком короткий. Пропускаю.")
-            storage.update_article_status(article.id, 'summary_failed_no_text')
-            continue
-        
-        final_prompt = prompt_template.format(
-            article_text=text_to_process[:20000],
-            theme_name=theme 
-        )
-        
-        print(f"   Отправляю промпт в GigaChat (Тема: '{theme}')...")
-        summary = giga.get_completion(final_prompt)
+    # Порядок задает планировщик: первыми — статьи тем, где модераторам скоро будет нечего смотреть
+    review_depth = storage.get_article_counts_by_theme('awaiting_review')
+    scheduled = schedule_summaries(queue, review_depth)
+    articles_to_process = storage.get_articles_by_ids([candidate.id for candidate in scheduled])
+    print_schedule_report(queue, scheduled, review_depth)
 
+    print(f"Найдено {len(queue)} статей для суммаризации, в этом цикле: {len(articles_to_process)}. Начинаю обработку (параллельно: {concurrency})...")
+
+    def finish(article, summary):
+        print(f"\n-> Статья: {article.title[:60]}... (Статус: {article.status})")
         if summary:
             print(f"  ✅ Получена выжимка длиной {len(summary)} символов.")
             storage.update_article_summary(article.id, summary)
@@ -98,8 +207,167 @@ def run_summary_cycle(storage: StorageService):
         else:
             print("  -> Не удалось получить выжимку от GigaChat.")
             storage.update_article_status(article.id, 'summary_failed_api_error')
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # future -> (статья, номер куска или None для итоговой выжимки)
+        pending = {}
+        chunk_notes = {} # article.id -> выжимки кусков (map-фаза)
+        arms = {} # article.id -> ветка (full, compressed, abstract) для отчета о задержках и токенах
+        batches = {} # future пачки аннотаций -> [(номер, статья, одиночный промпт)]
+        # Аннотации пачками: пачку ограничивает и число статей, и бюджет токенов одного запроса
+        abstract_batch, abstract_batch_tokens, abstract_batch_start = [], 0, 0
+        map_reduce_count = 0
+
+        def submit_abstract_batch(batch):
+            if len(batch) == 1:
+                _, article, single_prompt = batch[0]
+                metrics.increment("articles_abstract")
+                pending[executor.submit(_timed_completion, giga, metrics, 'abstract', single_prompt, article_id=article.id,
+                                         template='summary_abstract_style')] = (article, None)
+                return
+            metrics.increment("articles_abstract_batch", len(batch))
+            future = executor.submit(_timed_completion, giga, metrics, 'abstract_batch', build_abstract_batch(abstract_batch_prompt, batch),
+                                     template='summary_abstract_batch',
+                                     max_tokens=ABSTRACT_MAX_TOKENS_PER_ITEM * len(batch))
+            pending[future], batches[future] = (None, None), batch
+
+        for position, article in enumerate(articles_to_process):
+            theme = article.theme_name or "Общие финансы"
+            if abstract_batch and position - abstract_batch_start >= ABSTRACT_BATCH_SIZE:
+                # Неполная пачка не ждет конца очереди дольше, чем длится сбор одной пачки
+                submit_abstract_batch(abstract_batch)
+                abstract_batch, abstract_batch_tokens = [], 0
+
+            if article.status == 'awaiting_full_summary':
+                prompt_template = full_summary_prompt
+                text_to_process = article.full_text
+                arm = compression_arm(article.id)
+            else: # awaiting_abstract_summary
+                prompt_template = abstract_summary_prompt
+                text_to_process = article.original_abstract
+                arm = 'abstract'
+
+            if not text_to_process or len(text_to_process) < 50:
+                print(f"\n-> {article.title[:60]}...: текст отсутствует или слишком короткий. Пропускаю.")
+                storage.update_article_status(article.id, 'summary_failed_no_text')
+                continue
+
+            if arm == 'compressed':
+                sections = sections_from_json(article.sections)
+                text_to_process = compress_text(
+                    select_sections(text_to_process, sections, COMPRESSION_SECTION_TYPES), article.title, article.original_abstract, slice_keywords.get(article.theme_name)
+                )
+            arms[article.id] = arm
+
+            if estimate_tokens(text_to_process) <= SINGLE_SHOT_TOKEN_BUDGET:
+                final_prompt = prompt_template.format(article_text=text_to_process, theme_name=theme)
+                if arm == 'abstract' and ABSTRACT_BATCH_SIZE > 1:
+                    # Пачка уходит, как только наберется: аннотации идут в порядке планировщика, а не в конце цикла
+                    if not abstract_batch:
+                        abstract_batch_start = position
+                    abstract_batch.append((len(abstract_batch) + 1, article, final_prompt))
+                    abstract_batch_tokens += estimate_tokens(article.original_abstract)
+                    if len(abstract_batch) >= ABSTRACT_BATCH_SIZE or abstract_batch_tokens >= SINGLE_SHOT_TOKEN_BUDGET // 2:
+                        submit_abstract_batch(abstract_batch)
+                        abstract_batch, abstract_batch_tokens = [], 0
+                    continue
+                metrics.increment(f"articles_{arm}")
+                is_news = prompt_template is full_summary_prompt
+                limits, template_name = (news_limits, 'summary_news_style') if is_news else ({}, 'summary_abstract_style')
+                pending[executor.submit(_timed_completion, giga, metrics, arm, final_prompt, article_id=article.id,
+                                         template=template_name, **limits)] = (article, None)
+                continue
+
+            # Длинный текст: выжимки кусков параллельно, затем сведение новостным промптом
+            metrics.increment(f"articles_{arm}")
+            chunks = plan_chunks(text_to_process)
+            map_reduce_count += 1
+            chunk_notes[article.id] = [None] * len(chunks)
+            for index, chunk in enumerate(chunks):
+                chunk_prompt = chunk_summary_prompt.format(
+                    article_text=chunk, theme_name=theme, chunk_index=index + 1, chunk_count=len(chunks)
+                )
+                future = executor.submit(_timed_completion, giga, metrics, arm, chunk_prompt, max_tokens=CHUNK_SUMMARY_MAX_TOKENS,
+                                         article_id=article.id, template='summary_chunk')
+                pending[future] = (article, index)
+
+        if abstract_batch:
+            submit_abstract_batch(abstract_batch)
+
+        print(f"   Отправлено в GigaChat: {len(pending)} промптов (статей через map-reduce: {map_reduce_count}, "
+              f"пачек аннотаций: {len(batches)}).")
+        postponed = set() # Статьи, оставленные в очереди: GigaChat недоступен или не ответил после всех повторов
+        gigachat_down = False # Сработал предохранитель: новые запросы не отправляем
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                article, chunk_index = pending.pop(future)
+                batch = batches.pop(future, None)
+                try:
+                    summary = future.result()
+                except (CircuitOpen, CancelledError):
+                    summary = None
+                    if not gigachat_down:
+                        gigachat_down = True
+                        print("\n⏸  GigaChat недоступен: оставшиеся статьи остаются в очереди до следующего цикла.")
+                        for other in pending:
+                            other.cancel()
+                    postponed.update([item[1].id for item in batch] if batch else [article.id])
+                except RetriesExhausted:
+                    # Временный сбой, а не ошибка статьи: она (или вся пачка) просто дождется следующего цикла
+                    summary = None
+                    postponed.update([item[1].id for item in batch] if batch else [article.id])
+                except Exception as e:
+                    print(f"  -> Ошибка в потоке суммаризации: {e}")
+                    summary = None
+
+                if batch:
+                    batch_ids = [item[1].id for item in batch]
+                    if gigachat_down or postponed.intersection(batch_ids):
+                        postponed.update(batch_ids); continue
+                    parsed = parse_abstract_batch(summary, [tag for tag, _, _ in batch])
+                    for tag, batch_article, single_prompt in batch:
+                        if tag in parsed:
+                            finish(batch_article, parsed[tag])
+                        else:
+                            # Не разобралось: эта аннотация уйдет отдельным запросом
+                            metrics.increment("abstract_batch_fallbacks")
+                            pending[executor.submit(_timed_completion, giga, metrics, 'abstract', single_prompt, article_id=batch_article.id,
+                                                                   template='summary_abstract_style')] = (batch_article, None)
+                    continue
+                if article.id in postponed:
+                    chunk_notes.pop(article.id, None)
+                    continue # Статус не трогаем: статья просто дождется следующего цикла
+                if chunk_index is None:
+                    finish(article, summary)
+                    continue
+
+                notes = chunk_notes.get(article.id)
+                if notes is None:
+                    continue # Статья уже провалена из-за другого куска
+                if not summary:
+                    # Без куска итог был бы неполным: оставшиеся ответы не ждем, статья уйдет на повтор
+                    del chunk_notes[article.id]
+                    finish(article, None)
+                    continue
+                notes[chunk_index] = summary
+                if all(notes):
+                    del chunk_notes[article.id]
+                    if gigachat_down:
+                        postponed.add(article.id); continue # Сведение уже не отправить
+                    combined = "\n\n".join(f"[Фрагмент {i + 1}/{len(notes)}]\n{note}" for i, note in enumerate(notes))
+                    final_prompt = full_summary_prompt.format(article_text=combined, theme_name=article.theme_name or "Общие финансы")
+                    pending[executor.submit(_timed_completion, giga, metrics, arms[article.id], final_prompt, article_id=article.id,
+                                           template='summary_reduce', **news_limits)] = (article, None)
     
-    print(f"\nОбработано {len(articles_to_process)} статей.")
+    print(f"\nОбработано {len(articles_to_process) - len(postponed)} статей, отложено до следующего цикла: {len(postponed)}.")
+    print_arm_report(metrics)
+    print_stream_report()
+    telemetry.flush()
+    if metrics.counters.get("abstract_batch_fallbacks"):
+        print(f"   Аннотаций из пачек, ушедших отдельными запросами: {metrics.counters['abstract_batch_fallbacks']}")
+    if cache:
+        cache.print_summary()
     print("=== РАБОТА АГЕНТА-СУММАРИЗАТОРА ЗАВЕРШЕНА ===")
 
 
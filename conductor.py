@@ -19,6 +19,7 @@ from apscheduler.schedulers.blocking import BlockingScheduler
 from main import run_collection_cycle
 # from agents.investigator_agent import run_investigation_cycle # <-- УДАЛЕНО
 from agents.content_extractor_agent import run_extraction_cycle
+from agents.ocr_agent import run_ocr_cycle
 from agents.summary_agent import run_summary_cycle
 from telegram_bot import run_telegram_bot
 
@@ -63,6 +64,9 @@ def run_training_mode():
     logger.info("--- Этап 2: Извлечение контента ---")
     run_extraction_cycle(storage)
 
+    logger.info("--- Этап 2.1: Распознавание картиночных PDF ---")
+    run_ocr_cycle(storage)
+
     logger.info("--- Этап 3: Суммаризация ---")
     run_summary_cycle(storage)
     
@@ -98,6 +102,8 @@ def run_production_mode():
     # 2. Регулярная обработка накопившихся статей
     # scheduler.add_job(run_investigation_cycle, 'interval', minutes=15, args=[StorageService()], name="Investigation_Cycle") # <-- УДАЛЕНО
     scheduler.add_job(run_extraction_cycle, 'interval', minutes=15, args=[StorageService()], name="Extraction_Cycle")
+    # OCR — отдельная задача со своим пулом процессов, чтобы не задерживать экстрактор
+    scheduler.add_job(run_ocr_cycle, 'interval', minutes=30, args=[StorageService()], name="OCR_Cycle", max_instances=1)
     scheduler.add_job(run_summary_cycle, 'interval', minutes=15, args=[StorageService()], name="Summary_Cycle")
     
     logger.info("Запуск Telegram-бота в фоновом режиме...")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+from urllib.parse import urljoin, unquote
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from bs4 import BeautifulSoup
+from readability import Document
+from services.html_document import HtmlDocument
+from agents.content_extractor_agent import find_best_pdf_link, extract_text_from_html
+
+DEFAULT_CORPUS_DIR = project_root / 'data' / 'fixtures' / 'html'
+BASE_URL = 'https://journal.example.org/index.php/jbf/article/view/1673'
+
+def legacy_find_best_pdf_link(soup: BeautifulSoup, base_url: str):
+    """Прежний поиск ссылки по дереву BeautifulSoup (та же логика оценки)."""
+    meta_tag = soup.find('meta', {'name': 'citation_pdf_url'})
+    if meta_tag and meta_tag.get('content'):
+        return meta_tag.get('content')
+    candidates = []
+    for link in soup.find_all('a', href=True):
+        href = link.get('href', '')
+        if not href or href.startswith('javascript:'): continue
+        full_url = urljoin(base_url, href)
+        decoded_url = unquote(full_url).lower()
+        link_text = link.get_text(strip=True).lower()
+        score = 0
+        if 'pdf' in link_text or '.pdf' in decoded_url or '/pdf' in decoded_url: score += 10
+        if 'download' in link_text or 'download' in decoded_url: score += 5
+        if 'full text' in link_text: score += 3
+        if 'pdf' in ' '.join(link.get('class', [])).lower(): score += 15
+        if any(k in link_text or k in decoded_url for k in ['copyright', 'form', 'template', 'submission', 'ethics', 'policy']): score -= 15
+        if any(ext in decoded_url for ext in ['.ris', '.bib', '.enw']) or 'citation' in link_text: score -= 20
+        if score > 5: candidates.append((score, full_url))
+    if not candidates: return None
+    candidates.sort(key=lambda x: x, reverse=True)
+    return candidates[0][1]
+
+def legacy_pipeline(html: str):
+    """Как было: html.parser для ссылок, затем readability и еще раз BeautifulSoup для текста."""
+    soup = BeautifulSoup(html, 'html.parser')
+    link = legacy_find_best_pdf_link(soup, BASE_URL)
+    # html_partial=True, как и в текущем конвейере, чтобы сравнивать одинаковый объем работы
+    summary = Document(html).summary(html_partial=True)
+    text = BeautifulSoup(summary, 'html.parser').get_text(separator='\n', strip=True)
+    return link, text
+
+def current_pipeline(html: str):
+    """Как стало: один разбор lxml на все этапы."""
+    document = HtmlDocument(html, BASE_URL)
+    return find_best_pdf_link(document), extract_text_from_html(document)
+
+def generate_publisher_page(seed: int) -> str:
+    """Тяжелая страница в духе издательских сайтов: меню, сайдбары, скрипты, длинный список литературы."""
+    rng = random.Random(seed)
+    words = "financial literacy households savings behavior nudges pension retirement risk investors survey".split()
+    def sentence(): return ' '.join(rng.choice(words) for _ in range(18)).capitalize() + '.'
+    nav = ''.join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(300))
+    sidebar = ''.join(f'<div class="widget"><a href="/related/{i}">{sentence()}</a></div>' for i in range(150))
+    body = ''.join(f'<h2>Part {i}</h2>' + ''.join(f'<p>{sentence()} {sentence()} {sentence()}</p>' for _ in range(8)) for i in range(12))
+    references = ''.join(f'<li>{sentence()} <a href="https://doi.org/10.1000/{i}">doi</a></li>' for i in range(250))
+    scripts = ''.join(f'<script>var tracker{i} = {{"id": {i}, "payload": "{"x" * 400}"}};</script>' for i in range(40))
+    return f"""<!DOCTYPE html><html><head><title>Article {seed}</title>{scripts}</head><body>
+<nav><ul>{nav}</ul></nav><aside>{sidebar}</aside>
+<article><h1>Behavioral finance article {seed}</h1>
+<div class="obj_galleys_links"><a class="obj_galley_link pdf" href="/index.php/jbf/article/download/1673/{seed}">PDF</a>
+<a href="/citation/ris/{seed}.ris">Download citation</a></div>
+{body}<section id="references"><ol>{references}</ol></section></article>
+<footer><a href="/policy">Privacy policy</a><a href="/submission">Submission form</a></footer></body></html>"""
+
+def generate_corpus(corpus_dir: Path, pages: int = 5):
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(pages):
+        (corpus_dir / f"publisher_{i + 1:02d}.html").write_text(generate_publisher_page(i), encoding='utf-8')
+    print(f"Сгенерировано {pages} HTML-страниц в {corpus_dir}")
+
+def measure(pipeline, html: str, repeats: int):
+    """Медианное процессорное время (мс) и результат последнего прогона."""
+    timings, result = [], None
+    for _ in range(repeats):
+        started = time.process_time()
+        result = pipeline(html)
+        timings.append((time.process_time() - started) * 1000)
+    return statistics.median(timings), result
+
+def run_benchmark(corpus_dir: Path, repeats: int):
+    html_files = sorted(corpus_dir.glob('*.html'))
+    if not html_files:
+        print(f"В {corpus_dir} нет HTML. Запустите скрипт с флагом --generate или положите туда сохраненные страницы.")
+        return
+
+    print(f"=== МИКРОБЕНЧМАРК РАЗБОРА HTML: {len(html_files)} страниц, {repeats} повторов ===")
+    total_legacy, total_current = 0.0, 0.0
+    for html_path in html_files:
+        html = html_path.read_text(encoding='utf-8', errors='replace')
+        legacy_ms, (legacy_link, legacy_text) = measure(legacy_pipeline, html, repeats)
+        current_ms, (current_link, current_text) = measure(current_pipeline, html, repeats)
+        total_legacy += legacy_ms; total_current += current_ms
+        same_link = "да" if legacy_link == current_link else f"нет ({legacy_link} / {current_link})"
+        print(f"\n{html_path.name} ({len(html) / 1024:.0f} КБ)")
+        print(f"  CPU на страницу: было {legacy_ms:7.1f} мс | стало {current_ms:7.1f} мс")
+        print(f"  Ссылка на PDF совпадает: {same_link}")
+        print(f"  Символов текста: было {len(legacy_text or '')} | стало {len(current_text or '')}")
+
+    saved = total_legacy - total_current
+    print("\n" + "=" * 30)
+    print(f"  Среднее CPU на страницу: было {total_legacy / len(html_files):.1f} мс, стало {total_current / len(html_files):.1f} мс")
+    print(f"  Экономия: {saved / len(html_files):.1f} мс на страницу ({saved / total_legacy:.0%})" if total_legacy else "")
+    print("=" * 30)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение CPU на разбор страницы: прежний конвейер (BeautifulSoup x2 + readability) против единого дерева lxml.")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS_DIR, help="Папка с сохраненными HTML-страницами.")
+    parser.add_argument("--repeats", type=int, default=5, help="Сколько раз обрабатывать каждую страницу.")
+    parser.add_argument("--generate", action="store_true", help="Сгенерировать синтетические страницы перед замером.")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_corpus(args.corpus)
+    run_benchmark(args.corpus, args.repeats)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import re
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Tuple, Optional
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+import fitz  # PyMuPDF
+from agents.content_extractor_agent import parse_pdf_from_binary
+
+DEFAULT_CORPUS_DIR = project_root / 'data' / 'fixtures' / 'pdf'
+RUNNING_HEADER = "Journal of Synthetic Behavioral Finance, Vol. 12"
+MARKER_PATTERN = re.compile(r'\[S(\d{4})\]')
+BARE_NUMBER_LINE = re.compile(r'^\s*\d{1,4}\s*$')
+
+def legacy_parse_pdf_from_binary(pdf_data: bytes) -> Tuple[Optional[str], bool]:
+    """Прежняя реализация (два вызова get_text на страницу и конкатенация строк) — эталон для сравнения."""
+    try:
+        text, is_image_only = "", True
+        with fitz.open(stream=pdf_data, filetype="pdf") as doc:
+            for page in doc:
+                if page.get_text("blocks"): is_image_only = False
+                text += page.get_text()
+        if not text.strip() and not is_image_only: return (None, False)
+        if not text.strip() and is_image_only: return (None, True)
+        return (text.strip(), False)
+    except Exception:
+        return (None, False)
+
+def generate_synthetic_corpus(corpus_dir: Path, documents: int = 5, pages: int = 12):
+    """
+    Создает двухколоночные PDF с колонтитулом и номерами страниц.
+    Каждое предложение помечено маркером [S0001], [S0002]..., что позволяет
+    проверить порядок чтения колонок.
+    """
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    filler = "Households with higher literacy save more."
+    rows = 40
+    for doc_index in range(documents):
+        doc = fitz.open()
+        sentence_no = 1
+        for page_no in range(1, pages + 1):
+            page = doc.new_page()
+            width, height = page.rect.width, page.rect.height
+            page.insert_text((50, 30), RUNNING_HEADER, fontsize=8)
+            page.insert_text((width / 2 - 5, height - 25), str(page_no), fontsize=8)
+            # Строки пишутся поперек колонок (как у многих издательских верстальщиков),
+            # поэтому в потоке содержимого колонки перемешаны.
+            for row in range(rows):
+                y = 70 + row * 17
+                page.insert_text((50, y), f"[S{sentence_no + row:04d}] {filler}", fontsize=8)
+                page.insert_text((width / 2 + 10, y + 8), f"[S{sentence_no + rows + row:04d}] {filler}", fontsize=8)
+            sentence_no += 2 * rows
+        doc.save(corpus_dir / f"synthetic_{doc_index + 1:02d}.pdf")
+        doc.close()
+    print(f"Сгенерировано {documents} синтетических PDF в {corpus_dir}")
+
+def measure_quality(text: Optional[str]) -> dict:
+    """Считает признаки качества: порядок маркеров, остатки колонтитулов и номеров страниц."""
+    if not text:
+        return {'chars': 0, 'order_score': None, 'header_residue': 0, 'page_number_lines': 0}
+    markers = [int(m) for m in MARKER_PATTERN.findall(text)]
+    order_score = None
+    if len(markers) > 1:
+        in_order = sum(1 for a, b in zip(markers, markers[1:]) if b == a + 1)
+        order_score = in_order / (len(markers) - 1)
+    return {
+        'chars': len(text),
+        'order_score': order_score,
+        'header_residue': text.count(RUNNING_HEADER),
+        'page_number_lines': sum(1 for line in text.splitlines() if BARE_NUMBER_LINE.match(line)),
+    }
+
+def benchmark(parser, pdf_data: bytes, repeats: int) -> Tuple[float, Optional[str]]:
+    """Возвращает медианное время разбора (мс) и текст последнего прогона."""
+    timings, text = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        text, _ = parser(pdf_data)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), text
+
+def run_benchmark(corpus_dir: Path, repeats: int):
+    pdf_files = sorted(corpus_dir.glob('*.pdf'))
+    if not pdf_files:
+        print(f"В {corpus_dir} нет PDF. Запустите скрипт с флагом --generate или положите туда свои файлы.")
+        return
+
+    print(f"=== БЕНЧМАРК РАЗБОРА PDF: {len(pdf_files)} файлов, {repeats} повторов ===")
+    totals = {'legacy': 0.0, 'current': 0.0}
+    for pdf_path in pdf_files:
+        pdf_data = pdf_path.read_bytes()
+        legacy_ms, legacy_text = benchmark(legacy_parse_pdf_from_binary, pdf_data, repeats)
+        current_ms, current_text = benchmark(parse_pdf_from_binary, pdf_data, repeats)
+        totals['legacy'] += legacy_ms; totals['current'] += current_ms
+        legacy_q, current_q = measure_quality(legacy_text), measure_quality(current_text)
+
+        print(f"\n{pdf_path.name}")
+        print(f"  Время:            было {legacy_ms:8.1f} мс | стало {current_ms:8.1f} мс")
+        print(f"  Символов:         было {legacy_q['chars']:8d}    | стало {current_q['chars']:8d}")
+        if legacy_q['order_score'] is not None:
+            print(f"  Порядок колонок:  было {legacy_q['order_score']:8.2%}    | стало {current_q['order_score']:8.2%}")
+        print(f"  Колонтитулы:      было {legacy_q['header_residue']:8d}    | стало {current_q['header_residue']:8d}")
+        print(f"  Номера страниц:   было {legacy_q['page_number_lines']:8d}    | стало {current_q['page_number_lines']:8d}")
+
+    speedup = totals['legacy'] / totals['current'] if totals['current'] else 0
+    print("\n" + "=" * 30)
+    print(f"  Суммарно: было {totals['legacy']:.1f} мс, стало {totals['current']:.1f} мс (x{speedup:.2f})")
+    print("=" * 30)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение прежнего и текущего разбора PDF по скорости и качеству.")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS_DIR, help="Папка с PDF-фикстурами.")
+    parser.add_argument("--repeats", type=int, default=5, help="Сколько раз разбирать каждый файл.")
+    parser.add_argument("--generate", action="store_true", help="Сгенерировать синтетический корпус перед замером.")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_synthetic_corpus(args.corpus)
+    run_benchmark(args.corpus, args.repeats)
@@ -1,15 +1,22 @@
 # get_domain_topics.py
-import requests
 import argparse
 import time
 import openpyxl
 import json
 from dotenv import load_dotenv
 import os
+import sys
+from pathlib import Path
+
+# --- Настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+from services.http_client import get_http_client
 
 # Загружаем email из .env для "вежливого" пула запросов
 load_dotenv()
 OPENALEX_EMAIL = os.getenv('OPENALEX_EMAIL', 'user@example.com')
+REQUEST_TIMEOUT = 30
 
 def save_topics_to_excel(topics, filename):
     """Сохраняет иерархический список топиков в Excel."""
@@ -63,7 +70,7 @@ def fetch_and_filter_all_topics(target_domain_shorthand):
         params = {'per-page': 200, 'page': page, 'mailto': OPENALEX_EMAIL}
         
         try:
-            response = requests.get("https://api.openalex.org/topics", params=params)
+            response = get_http_client().get("https://api.openalex.org/topics", params=params, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             data = response.json()
             results = data.get('results', [])
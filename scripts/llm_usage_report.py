@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+from dotenv import load_dotenv
+load_dotenv(dotenv_path=project_root / '.env')
+
+from services.storage_service import StorageService
+from services.extraction_metrics import percentile
+
+GROUP_FIELDS = ('day', 'theme', 'template', 'model', 'outcome')
+# Цена за 1000 токенов (промпт + ответ); 0 — стоимость не считаем
+GIGACHAT_PRICE_PER_1K_TOKENS = float(os.getenv('GIGACHAT_PRICE_PER_1K_TOKENS', 0))
+PAID_OUTCOMES = ('ok', 'cut', 'empty')
+
+def group_key(call, theme, fields) -> tuple:
+    values = {
+        'day': f"{call.created_at:%Y-%m-%d}",
+        'theme': theme or '—',
+        'template': call.template or '—',
+        'model': call.model or '—',
+        'outcome': call.outcome,
+    }
+    return tuple(values[field] for field in fields)
+
+def print_llm_usage_report(storage: StorageService, days: int, fields: list, price_per_1k: float):
+    """Сводка журнала llm_calls: вызовы, исходы, токены, задержки и стоимость по группам."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    rows = storage.get_llm_calls(since)
+    if not rows:
+        print(f"За последние {days} дн. вызовов LLM в журнале нет."); return
+
+    groups = defaultdict(list)
+    for call, theme, _ in rows:
+        groups[group_key(call, theme, fields)].append(call)
+
+    header = " / ".join(fields)
+    print(f"{header:<60} {'Вызовов':>8} {'Ошибок':>7} {'Кэш':>5} {'Обрез.':>6} {'Токены вх/вых':>16} {'p50, с':>7} {'p95, с':>7}"
+          + (f" {'Стоимость':>10}" if price_per_1k else ""))
+    print("-" * (122 + (11 if price_per_1k else 0)))
+    total_tokens = 0
+    for key in sorted(groups):
+        calls = groups[key]
+        paid = [call for call in calls if call.outcome in PAID_OUTCOMES]
+        latencies = [call.latency_ms for call in paid]
+        prompt_tokens = sum(call.prompt_tokens for call in paid)
+        completion_tokens = sum(call.completion_tokens for call in paid)
+        total_tokens += prompt_tokens + completion_tokens
+        errors = sum(call.outcome in ('error', 'circuit_open') for call in calls)
+        cache_hits = sum(call.outcome == 'cache_hit' for call in calls)
+        cut = sum(call.outcome == 'cut' for call in calls)
+        line = (f"{' / '.join(key)[:60]:<60} {len(calls):>8} {errors:>7} {cache_hits:>5} {cut:>6} "
+                f"{f'{prompt_tokens}/{completion_tokens}':>16} {percentile(latencies, 50) / 1000:>7.1f} {percentile(latencies, 95) / 1000:>7.1f}")
+        if price_per_1k:
+            line += f" {(prompt_tokens + completion_tokens) / 1000 * price_per_1k:>10.2f}"
+        print(line)
+
+    # Опубликованные статьи, на которые в этом окне тратились вызовы: вся трата окна (включая отклоненные) делится на них
+    published = {call.article_id for call, _, status in rows if status == 'published'}
+    print(f"\nВсего вызовов: {len(rows)}, токенов: {total_tokens}, опубликовано статей с вызовами в окне: {len(published)}")
+    if price_per_1k:
+        total_cost = total_tokens / 1000 * price_per_1k
+        per_post = f"{total_cost / len(published):.2f}" if published else "—"
+        print(f"Стоимость: {total_cost:.2f}, на один опубликованный пост: {per_post}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчет по журналу вызовов LLM (таблица llm_calls): время, токены и деньги на суммаризацию.")
+    parser.add_argument("--days", type=int, default=7, help="За сколько последних дней.")
+    parser.add_argument("--by", default="day,theme,template",
+                        help=f"Группировка через запятую из: {', '.join(GROUP_FIELDS)}.")
+    parser.add_argument("--price-per-1k", type=float, default=GIGACHAT_PRICE_PER_1K_TOKENS,
+                        help="Цена 1000 токенов для расчета стоимости (по умолчанию GIGACHAT_PRICE_PER_1K_TOKENS).")
+    args = parser.parse_args()
+
+    group_fields = [field.strip() for field in args.by.split(',') if field.strip()]
+    unknown = [field for field in group_fields if field not in GROUP_FIELDS]
+    if unknown:
+        parser.error(f"неизвестные поля группировки: {', '.join(unknown)}")
+    print_llm_usage_report(StorageService(), args.days, group_fields, args.price_per_1k)
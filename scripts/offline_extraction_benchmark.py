@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from uuid import uuid4
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit
+
+import yaml
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+DEFAULT_CORPUS_DIR = project_root / 'data' / 'fixtures' / 'publisher'
+MANIFEST_NAME = 'manifest.yaml'
+# Хост в абсолютных ссылках корпуса: порт сервера известен только при прогоне, он подставляется при отдаче HTML
+CORPUS_BASE_URL = 'http://publisher.invalid'
+
+# ==============================================================================
+# --- ЛОКАЛЬНЫЙ "ИЗДАТЕЛЬ" ---
+# ==============================================================================
+class PublisherStandIn:
+    """
+    Локальный HTTP-сервер, который отдает записанный корпус вместо живых сайтов.
+    Маршруты берутся из manifest.yaml: редирект, файл или код ответа, плюс
+    задержка (latency_ms) и доля сбоев (fail_rate) — на маршрут или глобально.
+    В HTML-ответах CORPUS_BASE_URL заменяется на адрес сервера.
+    """
+    def __init__(self, corpus_dir: Path, manifest: dict, latency_ms: float = 0, fail_rate: float = 0, seed: int = 42):
+        self.corpus_dir = corpus_dir
+        self.routes = manifest.get('routes') or {}
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = Counter()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def _roll_failure(self, fail_rate: float) -> bool:
+        with self._rng_lock:
+            return self.rng.random() < fail_rate
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = stand_in.routes.get(self.path) or stand_in.routes.get(urlsplit(self.path).path)
+                stand_in.requests['total'] += 1
+                time.sleep((stand_in.latency_ms + (route or {}).get('latency_ms', 0)) / 1000)
+                if route is None:
+                    return self._reply(404, b'Not found', 'text/html')
+                if stand_in._roll_failure(max(stand_in.fail_rate, route.get('fail_rate', 0))):
+                    stand_in.requests['injected_failures'] += 1
+                    return self._reply(503, b'Service unavailable', 'text/html')
+                if 'redirect' in route:
+                    self.send_response(route.get('status', 302))
+                    self.send_header('Location', route['redirect'])
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = (stand_in.corpus_dir / route['file']).read_bytes() if 'file' in route else b''
+                content_type = route.get('content_type', 'text/html; charset=utf-8')
+                if 'html' in content_type:
+                    body = body.replace(CORPUS_BASE_URL.encode(), stand_in.base_url.encode())
+                self._reply(route.get('status', 200), body, content_type)
+
+            def _reply(self, status: int, body: bytes, content_type: str):
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    stand_in.requests['client_aborts'] += 1 # Клиент не дождался ответа (таймаут)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+def load_manifest(corpus_dir: Path) -> dict:
+    with open(corpus_dir / MANIFEST_NAME, encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+def save_manifest(corpus_dir: Path, manifest: dict):
+    with open(corpus_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(manifest, f, allow_unicode=True, sort_keys=False)
+
+# ==============================================================================
+# --- ПОДГОТОВКА КОРПУСА ---
+# ==============================================================================
+def generate_corpus(corpus_dir: Path, articles_per_kind: int = 3):
+    """
+    Синтетический корпус, покрывающий все маршруты экстрактора:
+    прямой PDF, DOI-редирект на страницу OJS со ссылкой на PDF,
+    страница с мета-тегом citation_pdf_url, страница без PDF и битая ссылка.
+    """
+    import fitz  # PyMuPDF
+    from scripts.benchmark_html_parsing import generate_publisher_page
+
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    routes, articles = {}, []
+
+    def write_pdf(name: str, seed: int, pages: int = 12, rows: int = 45):
+        doc = fitz.open()
+        for page_no in range(1, pages + 1):
+            page = doc.new_page()
+            for row in range(rows):
+                line = f"[A{seed:03d}-P{page_no:02d}-L{row:02d}] Households with higher financial literacy save more."
+                page.insert_text((50, 60 + row * 16), line, fontsize=9)
+        doc.save(corpus_dir / name)
+        doc.close()
+        return {'file': name, 'content_type': 'application/pdf'}
+
+    for i in range(articles_per_kind):
+        # 1. Прямая ссылка на PDF (как pdf_url из OpenAlex)
+        routes[f'/files/direct_{i}.pdf'] = write_pdf(f'direct_{i}.pdf', i)
+        articles.append({'title': f'Direct PDF {i}', 'start': f'/files/direct_{i}.pdf', 'content_type': 'pdf'})
+
+        # 2. DOI -> страница OJS -> ссылка "PDF" -> файл
+        landing_html = generate_publisher_page(i).replace('/index.php/jbf/article/download/1673/', f'/index.php/jbf/article/download/{i}/')
+        (corpus_dir / f'ojs_{i}.html').write_text(landing_html, encoding='utf-8')
+        routes[f'/doi/10.1000/ojs.{i}'] = {'redirect': f'/index.php/jbf/article/view/{i}'}
+        routes[f'/index.php/jbf/article/view/{i}'] = {'file': f'ojs_{i}.html'}
+        routes[f'/index.php/jbf/article/download/{i}/{i}'] = write_pdf(f'ojs_{i}.pdf', 100 + i)
+        articles.append({'title': f'OJS landing {i}', 'start': f'/doi/10.1000/ojs.{i}'})
+
+        # 3. Ссылка на PDF только в мета-теге
+        meta_html = (f'<html><head><meta name="citation_pdf_url" content="{CORPUS_BASE_URL}/content/pdf/meta_{i}.pdf"></head>'
+                     f'<body><h1>Meta article {i}</h1><p>Abstract only.</p></body></html>')
+        (corpus_dir / f'meta_{i}.html').write_text(meta_html, encoding='utf-8')
+        routes[f'/article/meta_{i}'] = {'file': f'meta_{i}.html'}
+        routes[f'/content/pdf/meta_{i}.pdf'] = write_pdf(f'meta_{i}.pdf', 200 + i)
+        articles.append({'title': f'Meta tag {i}', 'start': f'/article/meta_{i}'})
+
+        # 4. Полный текст есть только в HTML
+        html_only = generate_publisher_page(300 + i).replace('class="obj_galley_link pdf"', 'class="obj_galley_link"').replace('>PDF<', '>Issue<')
+        html_only = html_only.replace('/index.php/jbf/article/download/1673/', '/issue/')
+        (corpus_dir / f'html_only_{i}.html').write_text(html_only, encoding='utf-8')
+        routes[f'/article/html_{i}'] = {'file': f'html_only_{i}.html'}
+        articles.append({'title': f'HTML only {i}', 'start': f'/article/html_{i}'})
+
+    # 5. Мертвая ссылка
+    routes['/files/gone.pdf'] = {'status': 404}
+    articles.append({'title': 'Broken link', 'start': '/files/gone.pdf', 'content_type': 'pdf'})
+
+    save_manifest(corpus_dir, {'articles': articles, 'routes': routes})
+    print(f"Сгенерирован корпус: {len(articles)} статей, {len(routes)} маршрутов в {corpus_dir}")
+
+def local_path(url: str) -> str:
+    """https://host/path?q -> /host/path?q: все записанные сайты живут под одним локальным сервером."""
+    parts = urlsplit(url)
+    return f"/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+
+def localize_html(html: str, page_url: str) -> str:
+    """
+    Переписывает ссылки страницы на локальные пути. citation_pdf_url остается
+    абсолютным, как у издателей, — с хостом CORPUS_BASE_URL.
+    """
+    import lxml.html
+    doc = lxml.html.document_fromstring(html)
+    doc.make_links_absolute(page_url)
+    doc.rewrite_links(lambda link: local_path(link) if link.startswith('http') else link)
+    for meta in doc.xpath('//meta[@name="citation_pdf_url"]'):
+        meta.set('content', CORPUS_BASE_URL + local_path(urljoin(page_url, meta.get('content', ''))))
+    return lxml.html.tostring(doc, encoding='unicode')
+
+def record_corpus(corpus_dir: Path, urls: list):
+    """
+    Записывает живые статьи: цепочку редиректов, страницу статьи и PDF,
+    найденный тем же поиском ссылок, что и в экстракторе. Дописывает manifest.yaml.
+    """
+    import requests
+    from services.html_document import HtmlDocument
+    from services.http_client import get_http_client
+    from agents.content_extractor_agent import find_best_pdf_link, USER_AGENT, REQUESTS_TIMEOUT, MAX_NAVIGATION_HOPS
+
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(corpus_dir) if (corpus_dir / MANIFEST_NAME).exists() else {'articles': [], 'routes': {}}
+    routes = manifest.setdefault('routes', {})
+
+    for url in urls:
+        print(f"-> Записываю {url}")
+        manifest['articles'].append({'title': f"Recorded: {url}", 'start': local_path(url)})
+        current_url = url
+        for _ in range(MAX_NAVIGATION_HOPS):
+            try:
+                response = get_http_client().get(current_url, headers={'User-Agent': USER_AGENT}, timeout=REQUESTS_TIMEOUT)
+            except requests.RequestException as e:
+                print(f"   -> Ошибка: {e}"); break
+            chain = [r.url for r in response.history] + [response.url]
+            for hop_url, next_url in zip(chain, chain[1:]):
+                routes[local_path(hop_url)] = {'redirect': local_path(next_url)}
+
+            content_type = response.headers.get('Content-Type', 'application/octet-stream')
+            file_name = f"rec_{uuid4().hex[:12]}"
+            if 'html' not in content_type.lower():
+                (corpus_dir / file_name).write_bytes(response.content)
+                routes[local_path(response.url)] = {'file': file_name, 'content_type': content_type, 'status': response.status_code}
+                break
+            html = response.text
+            (corpus_dir / f"{file_name}.html").write_text(localize_html(html, response.url), encoding='utf-8')
+            routes[local_path(response.url)] = {'file': f"{file_name}.html", 'status': response.status_code}
+            next_url = find_best_pdf_link(HtmlDocument(html, response.url))
+            if not next_url or local_path(next_url) in routes: break
+            current_url = next_url
+
+    save_manifest(corpus_dir, manifest)
+    print(f"Манифест обновлен: {len(manifest['articles'])} статей, {len(routes)} маршрутов.")
+
+# ==============================================================================
+# --- ПРОГОН ---
+# ==============================================================================
+def run_benchmark(corpus_dir: Path, latency_ms: float, fail_rate: float, seed: int) -> dict:
+    manifest = load_manifest(corpus_dir)
+    # БД и кэш сырых документов прогона живут во временной папке и удаляются вместе с ней
+    with tempfile.TemporaryDirectory(prefix='extraction_bench_') as work_dir:
+        return _run_benchmark(corpus_dir, manifest, Path(work_dir), latency_ms, fail_rate, seed)
+
+def _run_benchmark(corpus_dir: Path, manifest: dict, work_dir: Path, latency_ms: float, fail_rate: float, seed: int) -> dict:
+    from services.storage_service import StorageService, Article
+    from services.raw_document_cache import RawDocumentCache
+    from services.extraction_metrics import extraction_metrics
+    from services.http_client import get_http_client
+    from agents.content_extractor_agent import run_extraction_cycle
+    from test_extractor import ResourceMonitor
+
+    with PublisherStandIn(corpus_dir, manifest, latency_ms, fail_rate, seed) as stand_in:
+        storage = StorageService(db_url=f"sqlite:///{work_dir / 'articles.db'}")
+        session = storage.Session()
+        for entry in manifest.get('articles') or []:
+            session.add(Article(id=str(uuid4()), title=entry['title'], status='new',
+                                content_url=stand_in.base_url + entry['start'],
+                                content_type=entry.get('content_type')))
+        session.commit(); session.close()
+
+        extraction_metrics.reset()
+        monitor = ResourceMonitor(interval=0.1)
+        monitor.start()
+        started = time.perf_counter()
+        error = None
+        try:
+            run_extraction_cycle(storage, pause_range=(0, 0), raw_cache=RawDocumentCache(str(work_dir / 'raw_cache')))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        avg_cpu, peak_mem = monitor.stop()
+
+        metrics = extraction_metrics.summary()
+        session = storage.Session()
+        statuses = Counter(status for (status,) in session.query(Article.status))
+        session.close()
+
+    articles = metrics['counters'].get('articles', 0)
+    return {
+        'corpus': str(corpus_dir),
+        'config': {'latency_ms': latency_ms, 'fail_rate': fail_rate, 'seed': seed},
+        'articles': articles,
+        'elapsed_sec': round(elapsed, 2),
+        'articles_per_minute': round(articles / elapsed * 60, 1) if elapsed else 0,
+        'browser_launches': metrics['counters'].get('browser_launches', 0),
+        'peak_memory_mb': round(peak_mem, 1),
+        'avg_cpu_percent': round(avg_cpu, 1),
+        'http_requests': dict(stand_in.requests),
+        'http_hosts': get_http_client().host_stats(),
+        'statuses': dict(statuses),
+        'stages': metrics['stages'],
+        'error': error,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воспроизводимый бенчмарк экстрактора на записанном корпусе и локальном сервере вместо издательств.")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS_DIR, help="Папка с manifest.yaml и файлами корпуса.")
+    parser.add_argument("--generate", action="store_true", help="Сгенерировать синтетический корпус перед прогоном.")
+    parser.add_argument("--record", nargs='+', metavar="URL", help="Записать живые статьи в корпус (и не запускать прогон).")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Задержка, добавляемая к каждому ответу сервера.")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Доля ответов 503 (от 0 до 1).")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора сбоев.")
+    parser.add_argument("--output", type=Path, help="Куда сохранить JSON-отчет (по умолчанию только stdout).")
+    args = parser.parse_args()
+
+    if args.record:
+        record_corpus(args.corpus, args.record)
+        sys.exit(0)
+    if args.generate:
+        generate_corpus(args.corpus)
+    if not (args.corpus / MANIFEST_NAME).exists():
+        print(f"В {args.corpus} нет {MANIFEST_NAME}. Запустите скрипт с --generate или --record.")
+        sys.exit(1)
+
+    report = run_benchmark(args.corpus, args.latency_ms, args.fail_rate, args.seed)
+    report_json = json.dumps(report, ensure_ascii=False, indent=2)
+    print("\n" + report_json)
+    if args.output:
+        args.output.write_text(report_json, encoding='utf-8')
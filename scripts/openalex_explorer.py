@@ -1,8 +1,16 @@
 # openalex_explorer.py
-import requests
 import argparse
 import json
 import openpyxl
+import sys
+from pathlib import Path
+
+# --- Настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+from services.http_client import get_http_client
+
+REQUEST_TIMEOUT = 30
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 
@@ -50,7 +58,7 @@ def fetch_all_entities(entity_type):
     print(f"Загружаю все записи для '{entity_type}'... (это может занять время)")
     while True:
         try:
-            response = requests.get(url, params=params)
+            response = get_http_client().get(url, params=params, timeout=REQUEST_TIMEOUT)
             response.raise_for_status(); data = response.json()
             results.extend(data.get('results', []))
             if not data.get('meta', {}).get('next_page'): break
@@ -68,7 +76,7 @@ def perform_search(entity_type, search_term, output_file=None):
     if entity_type not in ['concepts', 'topics']: print("Ошибка: Поиск поддерживается только для 'concepts' и 'topics'."); return
     url = f"https://api.openalex.org/{entity_type}"; params = {'search': search_term, 'per-page': 200}
     try:
-        response = requests.get(url, params=params)
+        response = get_http_client().get(url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status(); results = response.json().get('results', [])
         if not results: print("По вашему запросу ничего не найдено."); return
         data_for_excel = []
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import argparse
+from pathlib import Path
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+from dotenv import load_dotenv
+load_dotenv(dotenv_path=project_root / '.env')
+
+from services.storage_service import StorageService
+from agents.content_extractor_agent import run_reextraction_cycle, REEXTRACTION_STATUSES
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Повторное извлечение текста из закэшированных PDF/HTML без повторной загрузки.")
+    parser.add_argument("--status", action="append", dest="statuses", help=f"Статус статей для пересчета (можно несколько раз). По умолчанию: {', '.join(REEXTRACTION_STATUSES)}.")
+    parser.add_argument("--limit", type=int, default=1000, help="Максимум статей за запуск.")
+    parser.add_argument("--db", type=str, default='sqlite:///data/articles.db', help="URL базы данных.")
+    args = parser.parse_args()
+
+    storage = StorageService(db_url=args.db)
+    run_reextraction_cycle(storage, statuses=args.statuses or REEXTRACTION_STATUSES, limit=args.limit)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import argparse
+from pathlib import Path
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+from dotenv import load_dotenv
+load_dotenv(dotenv_path=project_root / '.env')
+
+from services.render_service import serve, RENDER_SERVICE_HOST, RENDER_SERVICE_PORT, RENDER_POOL_SIZE, RENDER_QUEUE_SIZE
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Общий сервис рендеринга страниц: фиксированный пул браузеров для всех процессов. Клиенты включаются переменной RENDER_SERVICE_URL.")
+    parser.add_argument("--host", default=RENDER_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=RENDER_SERVICE_PORT)
+    parser.add_argument("--pool-size", type=int, default=RENDER_POOL_SIZE, help="Сколько браузеров держать.")
+    parser.add_argument("--queue-size", type=int, default=RENDER_QUEUE_SIZE, help="Сколько задач может ждать в очереди.")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.pool_size, args.queue_size)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import sys
+from pathlib import Path
+
+# --- Надежная загрузка .env и настройка импортов ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from services.storage_service import StorageService
+from services.url_rewriter import load_rewrite_rules
+
+def print_rewrite_rule_stats(storage: StorageService):
+    """Печатает, какие правила переписывания ссылок окупаются, а какие только тратят запросы."""
+    stats = {stat.rule_name: stat for stat in storage.get_rewrite_rule_stats()}
+    rule_names = [rule.name for rule in load_rewrite_rules()]
+    # Правила, удаленные из YAML, тоже показываем: по ним осталась история
+    rule_names += [name for name in stats if name not in rule_names]
+
+    print(f"{'Правило':<32} {'Попыток':>8} {'Попаданий':>10} {'Hit rate':>9}  Последнее попадание")
+    print("-" * 90)
+    for name in rule_names:
+        stat = stats.get(name)
+        attempts, hits = (stat.attempts, stat.hits) if stat else (0, 0)
+        hit_rate = f"{hits / attempts:.0%}" if attempts else "—"
+        last_hit = f"{stat.last_hit_at:%Y-%m-%d %H:%M}" if stat and stat.last_hit_at else "—"
+        print(f"{name:<32} {attempts:>8} {hits:>10} {hit_rate:>9}  {last_hit}")
+
+if __name__ == "__main__":
+    print_rewrite_rule_stats(StorageService())
@@ -44,6 +44,7 @@ class ArxivFetcher:
                 'title': result.title,
                 'source_name': 'arXiv',
                 'content_url': result.pdf_url,
+                'content_type': 'pdf',
                 'doi': result.doi,
                 'year': result.published.year,
                 'original_abstract': result.summary.replace('\n', ' '),
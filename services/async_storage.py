@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from services.storage_service import StorageService
+
+# --- Константы ---
+# Потоки под запросы к БД из бота: SQLite все равно сериализует запись, больше двух не нужно
+STORAGE_EXECUTOR_THREADS = int(os.getenv('STORAGE_EXECUTOR_THREADS', 2))
+
+class AsyncStorageService:
+    """
+    Асинхронный фасад над StorageService для Telegram-бота. Каждый метод
+    StorageService доступен как корутина: вызов уходит в отдельный пул потоков,
+    поэтому ожидание блокировки SQLite (пока ее держат задачи Дирижера)
+    не останавливает цикл событий и обработку остальных апдейтов.
+    Пример: articles = await storage.get_articles_by_status('awaiting_review', limit=10)
+    """
+    def __init__(self, storage: StorageService, max_workers: int = STORAGE_EXECUTOR_THREADS):
+        self.storage = storage
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Пул создается лениво и пересоздается после shutdown(): фасад живет на уровне модуля бота
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='storage')
+            return self._executor
+
+    def __getattr__(self, name: str):
+        method = getattr(self.storage, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), functools.partial(method, *args, **kwargs))
+
+        setattr(self, name, call) # Обертка создается один раз на метод
+        return call
+
+    def shutdown(self):
+        """Не ждет текущих запросов (зовется из цикла событий): они доработают в своих потоках."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
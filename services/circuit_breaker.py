@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+class CircuitOpen(Exception):
+    """Внешний сервис признан недоступным; запросы не отправляются до retry_at."""
+    def __init__(self, name: str, retry_at: float):
+        self.name = name
+        self.retry_at = retry_at
+        super().__init__(f"{name} недоступен, повтор через {max(0, retry_at - time.monotonic()):.0f} сек")
+
+class CircuitBreaker:
+    """
+    Потокобезопасный предохранитель. После failure_threshold транзиентных
+    ошибок подряд размыкается на reset_timeout секунд: все вызовы check()
+    сразу получают CircuitOpen. Затем пропускает один пробный запрос
+    (half-open): успех замыкает цепь, ошибка снова размыкает ее.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 300):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._failures >= self.failure_threshold and time.monotonic() < self._opened_until
+
+    def check(self):
+        """Пропускает вызов или бросает CircuitOpen."""
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return
+            if time.monotonic() < self._opened_until or self._probe_in_flight:
+                raise CircuitOpen(self.name, max(self._opened_until, time.monotonic() + 1))
+            self._probe_in_flight = True # Пробный запрос после паузы
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Учитывает транзиентную ошибку. Возвращает True, если цепь разомкнулась именно сейчас."""
+        with self._lock:
+            was_probe, self._probe_in_flight = self._probe_in_flight, False
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return False
+            opened_now = was_probe or self._failures == self.failure_threshold
+            if opened_now:
+                self._opened_until = time.monotonic() + self.reset_timeout
+            return opened_now
+
+    def trip(self):
+        """Размыкает цепь сразу, без счета ошибок: сбой заведомо не пройдет сам (например, отозван ключ)."""
+        with self._lock:
+            self._failures = max(self._failures, self.failure_threshold)
+            self._probe_in_flight = False
+            self._opened_until = time.monotonic() + self.reset_timeout
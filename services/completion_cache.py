@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from services.storage_service import StorageService
+
+# --- Константы ---
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') != '0'
+LLM_CACHE_TTL_DAYS = float(os.getenv('LLM_CACHE_TTL_DAYS', 0)) # 0 — записи не устаревают
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 20000)) # 0 — без ограничения
+
+def completion_key(prompt: str, model: str, temperature: float, max_tokens: int, max_chars: Optional[int] = None) -> str:
+    """Ключ кэша: хэш промпта вместе с моделью и параметрами генерации."""
+    params = [model, round(float(temperature), 4), int(max_tokens)]
+    if max_chars:
+        params.append(int(max_chars)) # Ответ, обрезанный потоком, не должен подменять полный
+    payload = json.dumps([*params, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class CompletionCache:
+    """
+    Постоянный кэш ответов LLM в таблице llm_completion_cache.
+    Повторный запрос с тем же промптом и параметрами (ретрай после
+    summary_failed_api_error, повторная постановка в очередь, пересуммаризация
+    после слияния) не тратит вызов GigaChat. Кэшируются только успешные ответы.
+    Счетчики считаются с момента создания объекта, т.е. за цикл.
+    """
+    def __init__(self, storage: StorageService, ttl_days: float = LLM_CACHE_TTL_DAYS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.storage = storage
+        self.max_age = timedelta(days=ttl_days) if ttl_days > 0 else None
+        self.max_entries = max_entries or None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            entry = self.storage.get_cached_completion(key, self.max_age)
+        except Exception as e:
+            print(f"   ...кэш LLM недоступен ({e}), иду в API.")
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.tokens_saved += entry.prompt_tokens + entry.completion_tokens
+        return entry.completion
+
+    def put(self, key: str, model: str, completion: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        try:
+            self.storage.save_cached_completion(key, model, completion, prompt_tokens, completion_tokens, self.max_entries)
+        except Exception as e:
+            # Кэш — оптимизация: ошибка записи не должна терять уже полученный ответ
+            print(f"   ...не удалось сохранить ответ в кэш LLM: {e}")
+
+    def summary(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'lookups': lookups,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'tokens_saved': self.tokens_saved,
+            }
+
+    def print_summary(self):
+        stats = self.summary()
+        if not stats['lookups']: return
+        print(f"--- Кэш LLM: попаданий {stats['hits']} из {stats['lookups']} ({stats['hit_rate']:.0%}), "
+              f"сэкономлено токенов: {stats['tokens_saved']} ---")
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга (q от 0 до 100)."""
+    if not values: return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+class StageMetrics:
+    """
+    Легковесный сбор таймингов по этапам и счетчиков событий конвейера.
+    Живет на уровне процесса (см. extraction_metrics), читается бенчмарками.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.timings[name].append(elapsed_ms)
+
+    def record(self, name: str, elapsed_ms: float):
+        """Для замеров, которые не укладываются в один блок with (например, время до первого токена)."""
+        with self._lock:
+            self.timings[name].append(elapsed_ms)
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {
+                    'count': len(values),
+                    'p50_ms': round(percentile(values, 50), 1),
+                    'p95_ms': round(percentile(values, 95), 1),
+                    'total_ms': round(sum(values), 1),
+                }
+                for name, values in sorted(self.timings.items())
+            }
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+extraction_metrics = StageMetrics()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+
+# --- Константы ---
+COMPRESSION_CHAR_BUDGET = int(os.getenv('SUMMARY_COMPRESSION_CHARS', 8000))
+MIN_SENTENCE_CHARS = 40 # Обрывки подписей, формул и колонтитулов не рассматриваем
+LEAD_SENTENCES = 3 # Начало статьи (постановка проблемы) берется всегда
+
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+(?=[A-ZА-ЯЁ0-9"«(])')
+WORD = re.compile(r'[^\W\d_]{3,}')
+STOP_WORDS = frozenset("""
+the and for are was were with that this these those from have has had not but its their they them than then
+which while where when what who whom into onto over under between among also such each both more most less
+been being can could may might should would will shall our ours his her hers you your yours one two all any
+some there here however thus therefore about above after before during through within without upon via per
+это как так что его она они оно для при над под без или уже еще был была были было быть этот эта эти того
+""".split())
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for sentence in SENTENCE_BREAK.split(re.sub(r'\s+', ' ', text or "")):
+        sentence = sentence.strip()
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            sentences.append(sentence)
+    return sentences
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOP_WORDS]
+
+def load_slice_keywords(sources_dir: Path) -> Dict[str, List[str]]:
+    """
+    Ключевые слова срезов по названию темы: context/aspect_keywords из
+    срезов OpenAlex и фразы в кавычках из запросов arXiv.
+    """
+    keywords = defaultdict(list)
+    for path in sorted(Path(sources_dir).glob('*.yaml')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                slice_config = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError):
+            continue
+        theme = slice_config.get('theme_name')
+        if not theme:
+            continue
+        keywords[theme].extend(slice_config.get('context_keywords') or [])
+        keywords[theme].extend(slice_config.get('aspect_keywords') or [])
+        keywords[theme].extend(re.findall(r'"([^"]+)"', slice_config.get('query') or ''))
+    return {theme: sorted(set(words)) for theme, words in keywords.items()}
+
+def rank_sentences(sentences: List[str], query: str) -> np.ndarray:
+    """
+    Оценки предложений: косинусная близость TF-IDF вектора предложения
+    к вектору запроса (название, аннотация, ключевые слова среза).
+    Матрица хранится разреженно — только ненулевые (предложение, термин),
+    поэтому память растет с длиной текста, а не с числом предложений × словарь.
+    """
+    vocabulary: Dict[str, int] = {}
+    rows, cols, counts = [], [], []
+    for row, sentence in enumerate(sentences):
+        for word, count in Counter(tokenize(sentence)).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+            counts.append(count)
+    if not vocabulary:
+        return np.zeros(len(sentences), dtype=np.float32)
+
+    rows, cols = np.array(rows), np.array(cols)
+    df = np.bincount(cols, minlength=len(vocabulary))
+    idf = (np.log((1 + len(sentences)) / (1 + df)) + 1).astype(np.float32)
+    weights = np.log1p(np.array(counts, dtype=np.float32)) * idf[cols] # Сублинейный TF: повтор термина в одном предложении мало что добавляет
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(sentences))).astype(np.float32)
+
+    query_vector = np.zeros(len(vocabulary), dtype=np.float32)
+    query_cols = [vocabulary[word] for word in tokenize(query) if word in vocabulary]
+    if not query_cols:
+        return np.zeros(len(sentences), dtype=np.float32)
+    np.add.at(query_vector, np.array(query_cols), 1.0)
+    query_vector = np.log1p(query_vector) * idf
+    query_vector /= np.linalg.norm(query_vector) + 1e-9
+    dots = np.bincount(rows, weights=weights * query_vector[cols], minlength=len(sentences)).astype(np.float32)
+    return dots / (norms + 1e-9)
+
+def compress_text(text: str, title: str = "", abstract: str = "", keywords: Optional[List[str]] = None,
+                  char_budget: int = COMPRESSION_CHAR_BUDGET) -> str:
+    """
+    Оставляет из полного текста самые близкие к теме предложения в пределах
+    char_budget символов, сохраняя их исходный порядок. Выбор детерминирован:
+    при равных оценках выигрывает более раннее предложение.
+    """
+    if not text or len(text) <= char_budget:
+        return text
+    sentences = split_sentences(text)
+    if not sentences:
+        return text[:char_budget]
+
+    scores = rank_sentences(sentences, " ".join([title or "", abstract or "", *(keywords or [])]))
+    lead = list(range(min(LEAD_SENTENCES, len(sentences))))
+    # Устойчивая сортировка по убыванию оценки: порядок не зависит от платформы
+    order = lead + [int(i) for i in np.argsort(-scores, kind='stable') if i >= len(lead)]
+
+    selected, seen, used = [], set(), 0
+    for index in order:
+        sentence = sentences[index]
+        # Предложения без общих с темой слов бюджет не занимают; повторы (колонтитулы) — тоже
+        if index >= len(lead) and scores[index] <= 0 or sentence in seen:
+            continue
+        if used + len(sentence) + 1 > char_budget:
+            continue
+        selected.append(index)
+        seen.add(sentence)
+        used += len(sentence) + 1
+    return " ".join(sentences[i] for i in sorted(selected))
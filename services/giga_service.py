@@ -1,51 +1,245 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
+import time
+import random
+import threading
+import httpx
 from gigachat import GigaChat
 from gigachat.models import Chat
-from typing import Optional
+from gigachat.exceptions import ResponseError
+from typing import Dict, Optional
+
+from services.rate_limiter import TokenBucket
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+from services.completion_cache import CompletionCache, completion_key
+from services.extraction_metrics import StageMetrics
+from services.llm_telemetry import LlmTelemetry
+from services.text_chunker import estimate_tokens
+
+# --- Константы ---
+GIGACHAT_MODEL = os.getenv('GIGACHAT_MODEL', 'GigaChat')
+GIGACHAT_REQUESTS_PER_MINUTE = float(os.getenv('GIGACHAT_REQUESTS_PER_MINUTE', 60))
+GIGACHAT_BURST = int(os.getenv('GIGACHAT_BURST', 3))
+GIGACHAT_MAX_RETRIES = int(os.getenv('GIGACHAT_MAX_RETRIES', 4)) # Повторы для 429, 5xx и сетевых ошибок
+GIGACHAT_TIMEOUT = float(os.getenv('GIGACHAT_TIMEOUT', 120))
+GIGACHAT_MAX_CONNECTIONS = int(os.getenv('GIGACHAT_MAX_CONNECTIONS', 8))
+RATE_LIMIT_BACKOFF_BASE = 2.0 # сек, удваивается с каждой попыткой
+TRANSIENT_BACKOFF_BASE = 1.0 # сек, удваивается с каждой попыткой
+# Предохранитель: столько транзиентных ошибок подряд (по всем потокам) — и GigaChat считается недоступным
+GIGACHAT_BREAKER_THRESHOLD = int(os.getenv('GIGACHAT_BREAKER_THRESHOLD', 5))
+GIGACHAT_BREAKER_RESET_SECONDS = float(os.getenv('GIGACHAT_BREAKER_RESET_SECONDS', 300))
+
+# Один лимитер на процесс: квота GigaChat общая для всех потоков и экземпляров GigaService
+rate_limiter = TokenBucket(GIGACHAT_REQUESTS_PER_MINUTE, burst=GIGACHAT_BURST)
+circuit_breaker = CircuitBreaker('GigaChat', GIGACHAT_BREAKER_THRESHOLD, GIGACHAT_BREAKER_RESET_SECONDS)
+
+# Тайминги потоковых ответов (время до первого токена, полное время) и счетчик обрезанных ответов
+completion_metrics = StageMetrics()
+SENTENCE_END = re.compile(r'[.!?…»"][)\]]*(?=\s|$)|\n\s*\n')
+MIN_CUT_RATIO = 0.5 # Граница предложения ищется не раньше половины лимита, иначе режем по слову
+
+_clients: Dict[str, GigaChat] = {}
+_clients_lock = threading.Lock()
+
+def get_giga_client(model: str = GIGACHAT_MODEL) -> GigaChat:
+    """
+    Один клиент GigaChat на процесс (и модель). Клиент потокобезопасен: держит
+    пул keep-alive соединений и кэширует OAuth-токен до истечения срока,
+    поэтому обмен кредов на токен не повторяется на каждом цикле.
+    """
+    with _clients_lock:
+        if model not in _clients:
+            credentials = os.getenv('GIGACHAT_CREDENTIALS')
+            if not credentials:
+                raise ValueError("КРИТИЧЕСКАЯ ОШИБКА: Не найден GIGACHAT_CREDENTIALS в переменных окружения!")
+            try:
+                # verify_ssl_certs=False нужно для работы на некоторых системах, где есть проблемы с сертификатами.
+                # Повторы библиотеки выключены: их делает GigaService, учитывая лимитер и предохранитель
+                _clients[model] = GigaChat(
+                    credentials=credentials, model=model, verify_ssl_certs=False, timeout=GIGACHAT_TIMEOUT,
+                    max_connections=GIGACHAT_MAX_CONNECTIONS, max_retries=0,
+                )
+            except Exception as e:
+                raise ConnectionError(f"Не удалось подключиться к GigaChat. Проверьте креды и сетевое соединение. Ошибка: {e}")
+        return _clients[model]
+
+def cut_at_sentence(text: str, max_chars: int) -> str:
+    """Обрезает текст до max_chars по последней границе предложения (или слова, если граница слишком рано)."""
+    if len(text) <= max_chars:
+        return text
+    boundary = 0
+    for match in SENTENCE_END.finditer(text, 0, max_chars):
+        boundary = match.end()
+    if boundary >= max_chars * MIN_CUT_RATIO:
+        return text[:boundary].strip()
+    return text[:max_chars].rsplit(' ', 1)[0].rstrip(' ,;:—-') + '…'
+
+class RetriesExhausted(Exception):
+    """GigaChat не ответил после всех повторов (429, 5xx, сеть): запрос стоит повторить в следующем цикле."""
+
+def _retry_after_seconds(error: ResponseError) -> Optional[float]:
+    try:
+        return float((error.headers or {}).get('retry-after'))
+    except (TypeError, ValueError):
+        return None
 
 class GigaService:
     """
     Сервис-обертка для удобной работы с API GigaChat.
     Инкапсулирует в себе всю логику аутентификации и отправки запросов.
+    Экземпляры легкие: клиент, лимитер и предохранитель общие для процесса.
     """
-    def __init__(self):
+    def __init__(self, cache: Optional[CompletionCache] = None, model: str = GIGACHAT_MODEL,
+                 telemetry: Optional[LlmTelemetry] = None):
+        """
+        Берет общий клиент GigaChat (креды из .env файла).
+        С cache ответы берутся из постоянного кэша и сохраняются в него,
+        с telemetry каждый вызов попадает в журнал llm_calls.
+        """
+        self.cache = cache
+        self.telemetry = telemetry
+        self.model = model
+        self.giga = get_giga_client(model)
+
+    def _stream(self, payload: Chat, max_chars: int, call: dict) -> str:
         """
-        Инициализирует клиент GigaChat, подтягивая креды из .env файла.
+        Читает потоковый ответ и прекращает его, как только набрано max_chars
+        символов: закрытие генератора рвет соединение, и модель перестает генерировать.
         """
-        credentials = os.getenv('GIGACHAT_CREDENTIALS')
-        if not credentials:
-            raise ValueError("КРИТИЧЕСКАЯ ОШИБКА: Не найден GIGACHAT_CREDENTIALS в переменных окружения!")
-        
+        started, first_token_at, parts, length, was_cut = time.perf_counter(), None, [], 0, False
+        stream = self.giga.stream(payload)
         try:
-            # verify_ssl_certs=False нужно для работы на некоторых системах, где есть проблемы с сертификатами
-            self.giga = GigaChat(credentials=credentials, verify_ssl_certs=False)
-        except Exception as e:
-            raise ConnectionError(f"Не удалось подключиться к GigaChat. Проверьте креды и сетевое соединение. Ошибка: {e}")
+            for chunk in stream:
+                call['usage'] = chunk.usage or call['usage']
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    call['ttft_ms'] = (first_token_at - started) * 1000
+                    completion_metrics.record('llm_ttft', call['ttft_ms'])
+                parts.append(delta)
+                length += len(delta)
+                if length > max_chars:
+                    was_cut = True
+                    break
+        finally:
+            stream.close()
+        completion_metrics.record('llm_stream_total', (time.perf_counter() - started) * 1000)
+        text = "".join(parts).strip()
+        if was_cut:
+            completion_metrics.increment('streams_cut')
+            call['outcome'] = 'cut'
+            text = cut_at_sentence(text, max_chars)
+        return text
 
-    def get_completion(self, prompt: str, temperature: float = 0.7, max_tokens: int = 1024) -> Optional[str]:
+    def get_completion(self, prompt: str, temperature: float = 0.7, max_tokens: int = 1024,
+                       system_prompt: Optional[str] = None, max_chars: Optional[int] = None,
+                       article_id: Optional[str] = None, template: Optional[str] = None) -> Optional[str]:
         """
         Отправляет промпт в GigaChat и возвращает ответ модели.
+        С max_chars ответ читается потоком и обрывается на границе предложения,
+        как только превысит лимит: многословная модель не тратит время и токены.
+        Возвращает None, если запрос не удался; бросает CircuitOpen, если
+        GigaChat признан недоступным, и RetriesExhausted, если временные ошибки
+        не прошли за все повторы, — в обоих случаях статью не нужно помечать ошибкой.
+        article_id и template нужны только для журнала вызовов (telemetry).
         """
         if not prompt:
             return None
 
+        cache_text = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+        call = {'outcome': 'error', 'attempts': 0, 'usage': None, 'ttft_ms': None, 'error': None, 'tokens': (0, 0)}
+        started = time.perf_counter()
         try:
-            payload = Chat(
-                messages=[
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            response = self.giga.chat(payload)
-            
-            if response.choices and response.choices[0].message.content:
-                return response.choices[0].message.content.strip()
-            return None
+            cache_key = None
+            if self.cache:
+                cache_key = completion_key(cache_text, self.model, temperature, max_tokens, max_chars)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    call['outcome'] = 'cache_hit'
+                    return cached
 
-        except Exception as e:
-            print(f"❌ Ошибка при обращении к GigaChat API: {e}")
-            return None
+            messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+            messages.append({"role": "user", "content": prompt})
+            payload = Chat(messages=messages, temperature=temperature, max_tokens=max_tokens)
+            completion = self._request(payload, max_chars, call)
+            if completion is not None:
+                # Оборванный поток usage не присылает: тогда токены оцениваем по длине
+                usage = call['usage']
+                call['tokens'] = (usage.prompt_tokens if usage else estimate_tokens(cache_text),
+                                  usage.completion_tokens if usage else estimate_tokens(completion))
+                if cache_key:
+                    self.cache.put(cache_key, self.model, completion, *call['tokens'])
+            return completion
+        except CircuitOpen:
+            call['outcome'] = 'circuit_open'
+            raise
+        finally:
+            if self.telemetry:
+                self.telemetry.record(
+                    outcome=call['outcome'], article_id=article_id, template=template, model=self.model,
+                    prompt_tokens=call['tokens'][0], completion_tokens=call['tokens'][1],
+                    latency_ms=(time.perf_counter() - started) * 1000, ttft_ms=call['ttft_ms'],
+                    attempts=call['attempts'], error=call['error'],
+                )
+
+    def _request(self, payload: Chat, max_chars: Optional[int], call: dict) -> Optional[str]:
+        """Запрос с повторами (429, 5xx, сеть) через общий лимитер и предохранитель; итог пишет в call."""
+        for attempt in range(GIGACHAT_MAX_RETRIES + 1):
+            circuit_breaker.check()
+            rate_limiter.acquire()
+            call['attempts'] = attempt + 1
+            try:
+                if max_chars:
+                    call['outcome'] = 'ok'
+                    completion = self._stream(payload, max_chars, call)
+                else:
+                    response = self.giga.chat(payload)
+                    completion = (response.choices[0].message.content or "").strip() if response.choices else ""
+                    call['usage'], call['outcome'] = response.usage, 'ok'
+            except ResponseError as e:
+                call['outcome'], call['error'] = 'error', f"HTTP {e.status_code}"
+                if e.status_code == 429:
+                    delay = _retry_after_seconds(e) or RATE_LIMIT_BACKOFF_BASE * 2 ** attempt + random.uniform(0, 1)
+                    # Пауза для всех потоков сразу, иначе они продолжат получать 429
+                    rate_limiter.cooldown(delay)
+                    print(f"   ...GigaChat ответил 429, пауза {delay:.1f} сек (попытка {attempt + 1}/{GIGACHAT_MAX_RETRIES + 1}).")
+                    continue
+                if e.status_code in (401, 403):
+                    # Ключ истек или отозван: это сбой инфраструктуры, а не статьи, и повторы его не исправят
+                    circuit_breaker.trip()
+                    print(f"❌ GigaChat отклонил авторизацию (HTTP {e.status_code}), суммаризация приостановлена на {GIGACHAT_BREAKER_RESET_SECONDS:.0f} сек.")
+                    raise CircuitOpen(circuit_breaker.name, time.monotonic() + GIGACHAT_BREAKER_RESET_SECONDS)
+                if e.status_code < 500:
+                    circuit_breaker.record_success() # API отвечает, проблема в самом запросе
+                    print(f"❌ Ошибка при обращении к GigaChat API: {e}")
+                    return None
+                error = e
+            except httpx.TransportError as e:
+                call['outcome'], call['error'] = 'error', f"{type(e).__name__}: {e}"
+                error = e
+            except Exception as e:
+                call['outcome'], call['error'] = 'error', f"{type(e).__name__}: {e}"
+                print(f"❌ Ошибка при обращении к GigaChat API: {e}")
+                return None
+            else:
+                circuit_breaker.record_success()
+                if not completion:
+                    call['outcome'] = 'empty'
+                    return None
+                return completion
+
+            # Транзиентная ошибка: 5xx, таймаут или обрыв соединения
+            if circuit_breaker.record_failure():
+                print(f"❌ GigaChat недоступен ({type(error).__name__}), суммаризация приостановлена на {GIGACHAT_BREAKER_RESET_SECONDS:.0f} сек.")
+                raise CircuitOpen(circuit_breaker.name, time.monotonic() + GIGACHAT_BREAKER_RESET_SECONDS)
+            if attempt < GIGACHAT_MAX_RETRIES:
+                delay = TRANSIENT_BACKOFF_BASE * 2 ** attempt + random.uniform(0, 1)
+                print(f"   ...временная ошибка GigaChat ({type(error).__name__}), повтор через {delay:.1f} сек (попытка {attempt + 1}/{GIGACHAT_MAX_RETRIES + 1}).")
+                time.sleep(delay)
 
+        print("❌ GigaChat не ответил после всех повторов, запрос отложен до следующего цикла.")
+        raise RetriesExhausted(call['error'] or "повторы исчерпаны")
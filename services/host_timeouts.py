@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# --- Константы ---
+# Верхние границы корзин гистограммы задержек, мс; последняя корзина — "дольше всех" и таймауты
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 15000, 30000)
+HISTOGRAM_MAX_SAMPLES = 200 # При переполнении счетчики делятся пополам: свежие замеры весят больше
+MIN_SAMPLES_FOR_ADAPTIVE = 5
+TIMEOUT_PERCENTILE = 95
+TIMEOUT_P95_MULTIPLIER = 3.0 # Запас над p95, чтобы не резать обычные "хвосты"
+MIN_ADAPTIVE_TIMEOUT = float(os.getenv('MIN_ADAPTIVE_TIMEOUT_SEC', 5))
+HOST_BACKOFF_AFTER_TIMEOUTS = int(os.getenv('HOST_BACKOFF_AFTER_TIMEOUTS', 3))
+HOST_BACKOFF_BASE = timedelta(minutes=int(os.getenv('HOST_BACKOFF_BASE_MINUTES', 30)))
+HOST_BACKOFF_MAX = timedelta(hours=24)
+
+class DeadlineExceeded(Exception):
+    """Общий лимит времени на статью исчерпан."""
+
+class HostBackedOff(Exception):
+    """Хост временно отложен после серии таймаутов."""
+    def __init__(self, host: str, until: datetime):
+        super().__init__(f"{host} отложен до {until:%Y-%m-%d %H:%M} UTC")
+        self.host = host
+        self.until = until
+
+class Deadline:
+    """
+    Общий бюджет времени на одну статью. Кооперативный: код сам спрашивает
+    остаток (timeout) между шагами, а не прерывается извне.
+    """
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded(f"лимит {self.seconds:.0f} сек исчерпан")
+
+    def timeout(self, limit: float) -> float:
+        """Таймаут очередного запроса: не больше limit и не дольше остатка бюджета."""
+        self.check()
+        return max(0.5, min(limit, self.remaining()))
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+class LatencyHistogram:
+    """Гистограмма задержек хоста с фиксированными корзинами (LATENCY_BUCKETS_MS)."""
+    def __init__(self, counts: Optional[List[int]] = None):
+        self.counts = list(counts) if counts and len(counts) == len(LATENCY_BUCKETS_MS) else [0] * len(LATENCY_BUCKETS_MS)
+
+    @property
+    def samples(self) -> int:
+        return sum(self.counts)
+
+    def add(self, latency_ms: float):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound), len(LATENCY_BUCKETS_MS) - 1)
+        self.counts[index] += 1
+        if self.samples > HISTOGRAM_MAX_SAMPLES:
+            self.counts = [count // 2 for count in self.counts]
+
+    def percentile_ms(self, q: float) -> float:
+        """Оценка перцентиля сверху: граница корзины, в которую он попал."""
+        threshold, running = self.samples * q / 100, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            running += count
+            if running >= threshold:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+class HostTimeoutPolicy:
+    """
+    Адаптивные таймауты и отсрочка для хостов издательств.
+    Таймаут хоста = p95 его задержки x TIMEOUT_P95_MULTIPLIER в пределах
+    [MIN_ADAPTIVE_TIMEOUT, max_timeout]; пока замеров мало — max_timeout.
+    После HOST_BACKOFF_AFTER_TIMEOUTS таймаутов подряд хост откладывается
+    с экспоненциально растущей паузой. Состояние хранится в БД (host_stats).
+    """
+    def __init__(self, storage, max_timeout: float):
+        self.storage = storage
+        self.max_timeout = max_timeout
+        self._hosts: Dict[str, dict] = {}
+
+    def _state(self, host: str) -> dict:
+        if host not in self._hosts:
+            stat = self.storage.get_host_stat(host)
+            self._hosts[host] = {
+                'histogram': LatencyHistogram(json.loads(stat.latency_histogram or '[]') if stat else None),
+                'consecutive_timeouts': stat.consecutive_timeouts if stat else 0,
+                # SQLite возвращает naive datetime, хотя пишем мы в UTC
+                'backoff_until': stat.backoff_until.replace(tzinfo=timezone.utc) if stat and stat.backoff_until else None,
+            }
+        return self._hosts[host]
+
+    def _save(self, host: str):
+        state = self._hosts[host]
+        self.storage.save_host_stat(host, json.dumps(state['histogram'].counts),
+                                    state['consecutive_timeouts'], state['backoff_until'])
+
+    def timeout_for(self, url: str) -> float:
+        histogram = self._state(host_of(url))['histogram']
+        if histogram.samples < MIN_SAMPLES_FOR_ADAPTIVE:
+            return self.max_timeout
+        adaptive = histogram.percentile_ms(TIMEOUT_PERCENTILE) / 1000 * TIMEOUT_P95_MULTIPLIER
+        return max(MIN_ADAPTIVE_TIMEOUT, min(self.max_timeout, adaptive))
+
+    def backoff_until(self, url: str) -> Optional[datetime]:
+        until = self._state(host_of(url))['backoff_until']
+        return until if until and until > datetime.now(timezone.utc) else None
+
+    def check(self, url: str):
+        until = self.backoff_until(url)
+        if until:
+            raise HostBackedOff(host_of(url), until)
+
+    def record_latency(self, url: str, seconds: float):
+        host = host_of(url)
+        state = self._state(host)
+        state['histogram'].add(seconds * 1000)
+        state['consecutive_timeouts'], state['backoff_until'] = 0, None
+        self._save(host)
+
+    def record_timeout(self, url: str):
+        host = host_of(url)
+        state = self._state(host)
+        # Таймаут — это задержка не меньше самой медленной корзины
+        state['histogram'].add(LATENCY_BUCKETS_MS[-1])
+        state['consecutive_timeouts'] += 1
+        excess = state['consecutive_timeouts'] - HOST_BACKOFF_AFTER_TIMEOUTS
+        if excess >= 0:
+            pause = min(HOST_BACKOFF_MAX, HOST_BACKOFF_BASE * (2 ** excess))
+            state['backoff_until'] = datetime.now(timezone.utc) + pause
+            print(f"    -> Хост {host} не отвечает {state['consecutive_timeouts']} раз подряд, откладываю его на {pause}.")
+        self._save(host)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import copy
+from functools import cached_property
+from typing import Iterator, List, Optional, Tuple
+
+import lxml.html
+from readability import Document
+
+class HtmlDocument:
+    """
+    Страница, разобранная lxml ровно один раз.
+    Одно и то же дерево используют поиск ссылок на PDF, чтение мета-тегов,
+    readability и превращение HTML в текст — раньше каждый из них
+    разбирал страницу заново.
+    """
+    def __init__(self, html: str, url: str):
+        self.html = html
+        self.url = url
+
+    @cached_property
+    def tree(self):
+        """Дерево строится при первом обращении, так что ошибки разбора всплывают там, где их ловят."""
+        # lxml не принимает str с XML-декларацией кодировки, поэтому такие страницы отдаем байтами
+        source = self.html.encode('utf-8') if self.html.lstrip().startswith('<?xml') else self.html
+        return lxml.html.document_fromstring(source)
+
+    def meta_content(self, name: str) -> Optional[str]:
+        values = self.tree.xpath('//meta[@name=$name]/@content', name=name)
+        return values[0] if values and values[0] else None
+
+    def links(self) -> Iterator[Tuple[str, str, List[str]]]:
+        """Ссылки страницы как (href, текст ссылки, css-классы)."""
+        for link in self.tree.iter('a'):
+            href = link.get('href')
+            if href:
+                yield href, flatten_text(link, separator=''), link.get('class', '').split()
+
+    def readability_text(self) -> str:
+        """Основной текст страницы по версии readability, по одной строке на текстовый узел."""
+        # readability правит переданное дерево (удаляет скрытые узлы), поэтому отдаем копию
+        summary_html = Document(copy.deepcopy(self.tree), url=self.url).summary(html_partial=True)
+        return flatten_text(lxml.html.fragment_fromstring(summary_html, create_parent='div'))
+
+def flatten_text(element, separator: str = '\n') -> str:
+    """Аналог BeautifulSoup.get_text(separator, strip=True) для дерева lxml."""
+    return separator.join(text.strip() for text in element.itertext() if text.strip())
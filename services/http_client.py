@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+# --- Константы ---
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 32)) # Сколько хостов держим в пуле
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 8)) # Соединений на хост (хедж-загрузки идут параллельно)
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+HTTP_BACKOFF_JITTER = float(os.getenv('HTTP_BACKOFF_JITTER', 0.5))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Потолок паузы по Retry-After: дольше ждать не будем, пусть хост отложит HostTimeoutPolicy
+HTTP_MAX_RETRY_AFTER = float(os.getenv('HTTP_MAX_RETRY_AFTER_SEC', 10))
+# Прокси для всех исходящих запросов; без него requests сам читает HTTP(S)_PROXY/NO_PROXY
+OUTBOUND_PROXY = os.getenv('OUTBOUND_PROXY')
+
+_request_context = threading.local() # Дедлайн текущего запроса потока (см. HttpClient.request)
+
+class BoundedRetry(Retry):
+    """
+    Retry, который не уходит за дедлайн вызывающего кода: Retry-After обрезается
+    до HTTP_MAX_RETRY_AFTER, а если пауза перед повтором не помещается в остаток
+    дедлайна, повторов больше нет (статусный ответ возвращается как есть).
+    """
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return min(retry_after, HTTP_MAX_RETRY_AFTER) if retry_after is not None else None
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        deadline = getattr(_request_context, 'deadline', None)
+        if deadline is not None:
+            retry_after = new_retry.get_retry_after(response) if response is not None and self.respect_retry_after_header else None
+            pause = retry_after or new_retry.get_backoff_time()
+            if time.monotonic() + pause >= deadline:
+                reason = error or ResponseError(f"повтор не помещается в дедлайн (пауза {pause:.1f} сек)")
+                raise MaxRetryError(_pool, url, reason) from reason
+        return new_retry
+
+class HostMetrics:
+    """Счетчики по одному хосту. Байты — по телу ответа, для потоковых — по Content-Length (нижняя оценка)."""
+    def __init__(self):
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes': self.bytes_received,
+            'avg_latency_ms': round(self.total_latency / self.responses * 1000, 1) if self.responses else 0,
+            'max_latency_ms': round(self.max_latency * 1000, 1),
+        }
+
+class HttpClient:
+    """
+    Общий HTTP-клиент проекта: одна requests.Session с пулом keep-alive
+    соединений, повторами с экспоненциальной паузой и джиттером, сжатием
+    (gzip/deflate, br — если установлен brotli), прокси и учетом по хостам.
+    Повторяются только ошибки соединения и статусы RETRY_STATUSES; таймауты
+    чтения не повторяются, иначе они умножали бы адаптивные таймауты экстрактора.
+    Паузы между повторами ограничены (BoundedRetry) и не выходят за deadline запроса.
+    """
+    def __init__(self, max_retries: int = HTTP_MAX_RETRIES, proxy: Optional[str] = OUTBOUND_PROXY):
+        retry = BoundedRetry(
+            total=max_retries, connect=max_retries, read=0, status=max_retries,
+            status_forcelist=RETRY_STATUSES, backoff_factor=HTTP_BACKOFF_FACTOR,
+            backoff_jitter=HTTP_BACKOFF_JITTER, raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        if proxy:
+            self.session.proxies.update({'http': proxy, 'https': proxy})
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, HostMetrics] = defaultdict(HostMetrics)
+
+    def request(self, method: str, url: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        """deadline (time.monotonic()) — к этому моменту повторы прекращаются, даже если попытки еще остались."""
+        host = (urlsplit(url).hostname or '').lower()
+        started = time.perf_counter()
+        _request_context.deadline = deadline
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                metrics = self._hosts[host]
+                metrics.requests += 1
+                metrics.errors += 1
+            raise
+        finally:
+            _request_context.deadline = None
+        latency = response.elapsed.total_seconds() if response.elapsed else time.perf_counter() - started
+        if kwargs.get('stream'):
+            content_length = response.headers.get('Content-Length', '')
+            received = int(content_length) if content_length.isdigit() else 0
+        else:
+            received = len(response.content)
+        with self._lock:
+            metrics = self._hosts[host]
+            metrics.requests += 1
+            metrics.responses += 1
+            metrics.errors += response.status_code >= 400
+            metrics.bytes_received += received
+            metrics.total_latency += latency
+            metrics.max_latency = max(metrics.max_latency, latency)
+        return response
+
+    def get(self, url: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, deadline=deadline, **kwargs)
+
+    def host_stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {host: metrics.as_dict() for host, metrics in sorted(self._hosts.items(), key=lambda item: -item[1].requests)}
+
+    def print_host_stats(self, limit: int = 10):
+        stats = list(self.host_stats().items())
+        if not stats: return
+        print(f"--- HTTP по хостам (топ-{min(limit, len(stats))} из {len(stats)}) ---")
+        for host, metrics in stats[:limit]:
+            print(f"  {host}: {metrics['requests']} запросов, ошибок {metrics['errors']}, "
+                  f"{metrics['bytes'] / 1024:.0f} КБ, в среднем {metrics['avg_latency_ms']:.0f} мс")
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+def get_http_client() -> HttpClient:
+    """Один клиент (и пул соединений) на процесс."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
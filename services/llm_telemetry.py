@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from services.storage_service import StorageService
+
+# --- Константы ---
+LLM_TELEMETRY_BATCH_SIZE = int(os.getenv('LLM_TELEMETRY_BATCH_SIZE', 50))
+
+class LlmTelemetry:
+    """
+    Буфер журнала вызовов LLM. Потоки суммаризатора только добавляют записи
+    в память; в таблицу llm_calls они уходят пачками по batch_size одним
+    INSERT и при flush() в конце цикла, так что запись в БД не стоит на пути вызова.
+    """
+    def __init__(self, storage: StorageService, batch_size: int = LLM_TELEMETRY_BATCH_SIZE):
+        self.storage = storage
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._buffer: List[dict] = []
+
+    def record(self, *, outcome: str, article_id: Optional[str] = None, template: Optional[str] = None,
+               model: Optional[str] = None, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency_ms: float = 0.0, ttft_ms: Optional[float] = None, attempts: int = 0, error: Optional[str] = None):
+        row = {
+            'created_at': datetime.now(timezone.utc), 'article_id': article_id, 'template': template, 'model': model,
+            'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'latency_ms': round(latency_ms, 1),
+            'ttft_ms': round(ttft_ms, 1) if ttft_ms is not None else None, 'attempts': attempts, 'outcome': outcome,
+            'error': error[:300] if error else None,
+        }
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) < self.batch_size:
+                return
+            rows, self._buffer = self._buffer, []
+        self._write(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        self._write(rows)
+
+    def _write(self, rows: List[dict]):
+        try:
+            self.storage.add_llm_calls(rows)
+        except Exception as e:
+            # Телеметрия не должна ронять суммаризацию
+            print(f"   ...не удалось записать журнал вызовов LLM ({len(rows)} записей): {e}")
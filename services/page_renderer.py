@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from services.http_client import get_http_client
+from services.extraction_metrics import extraction_metrics
+
+# --- Константы ---
+# Экстрактору нужен только DOM: картинки, шрифты, видео и стили он не использует
+BLOCKED_RESOURCE_TYPES = set(filter(None, os.getenv(
+    'BROWSER_BLOCKED_RESOURCE_TYPES', 'image,media,font,stylesheet'
+).split(',')))
+# Аналитика, реклама и виджеты соцсетей; домен блокируется вместе с поддоменами
+DEFAULT_BLOCKED_DOMAINS = [
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'googleadservices.com',
+    'doubleclick.net', 'adnxs.com', 'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com',
+    'facebook.net', 'connect.facebook.net', 'platform.twitter.com', 'addthis.com', 'sharethis.com',
+    'hotjar.com', 'scorecardresearch.com', 'quantserve.com', 'crazyegg.com', 'mouseflow.com',
+    'newrelic.com', 'nr-data.net', 'cdn.segment.com', 'optimizely.com', 'mc.yandex.ru',
+    'top-fwz1.mail.ru', 'altmetric.com', 'plumx.plu.mx', 'trendmd.com', 'badge.dimensions.ai',
+]
+BLOCKED_DOMAINS = DEFAULT_BLOCKED_DOMAINS + list(filter(None, os.getenv('BROWSER_BLOCKED_DOMAINS', '').split(',')))
+
+def is_blocked_domain(host: str) -> bool:
+    host = (host or '').lower()
+    return any(host == domain or host.endswith('.' + domain) for domain in BLOCKED_DOMAINS)
+
+class PageLoadStats:
+    """
+    Учет одной загрузки страницы: запросы, байты, заблокированное и время.
+    Байты считаются по Content-Length, поэтому для chunked-ответов это нижняя оценка.
+    """
+    def __init__(self, url: str):
+        self.url = url
+        self.requests = 0
+        self.blocked_requests = 0
+        self.bytes_received = 0
+        self.started_at = time.perf_counter()
+        self.elapsed_ms = None
+
+    def finish(self) -> 'PageLoadStats':
+        self.elapsed_ms = (time.perf_counter() - self.started_at) * 1000
+        return self
+
+    def __str__(self):
+        return (f"{self.requests} запросов, {self.bytes_received / 1024:.0f} КБ, "
+                f"заблокировано {self.blocked_requests}, {self.elapsed_ms or 0:.0f} мс")
+
+class BrowserRequestPolicy:
+    """
+    Перехват запросов Playwright: тяжелые ресурсы и сторонние трекеры
+    отбрасываются до загрузки, остальное пропускается с подсчетом байт.
+    Подключается к странице один раз (attach), а статистика ведется
+    по каждой навигации отдельно (start_page / finish_page).
+    """
+    def __init__(self, blocked_resource_types: set = BLOCKED_RESOURCE_TYPES):
+        self.blocked_resource_types = blocked_resource_types
+        self.current: Optional[PageLoadStats] = None
+        self.total_bytes = 0
+        self.total_blocked = 0
+
+    def attach(self, page):
+        page.route("**/*", self._handle_route)
+        page.on("response", self._on_response)
+
+    def start_page(self, url: str) -> PageLoadStats:
+        self.current = PageLoadStats(url)
+        return self.current
+
+    def finish_page(self) -> Optional[PageLoadStats]:
+        stats, self.current = self.current, None
+        if stats is None: return None
+        self.total_bytes += stats.bytes_received
+        self.total_blocked += stats.blocked_requests
+        return stats.finish()
+
+    def _handle_route(self, route):
+        request = route.request
+        # Главный документ не трогаем никогда, даже если это "картинка" или трекер
+        is_navigation = request.is_navigation_request()
+        if not is_navigation and (request.resource_type in self.blocked_resource_types
+                                  or is_blocked_domain(urlsplit(request.url).hostname)):
+            if self.current: self.current.blocked_requests += 1
+            route.abort()
+            return
+        if self.current: self.current.requests += 1
+        route.continue_()
+
+    def _on_response(self, response):
+        if not self.current: return
+        try:
+            self.current.bytes_received += int(response.headers.get('content-length') or 0)
+        except ValueError:
+            pass
+
+# ==============================================================================
+# --- РЕНДЕРЕРЫ СТРАНИЦ: СВОЙ БРАУЗЕР ИЛИ ОБЩИЙ СЕРВИС ---
+# ==============================================================================
+RENDER_SERVICE_URL = os.getenv('RENDER_SERVICE_URL') # Например, http://127.0.0.1:8931
+BROWSER_MAX_RENDERS = int(os.getenv('BROWSER_MAX_RENDERS', 200)) # Перезапуск браузера от утечек памяти
+RENDER_QUEUE_WAIT_SECONDS = float(os.getenv('RENDER_QUEUE_WAIT_SECONDS', 60))
+BROWSER_RELAUNCH_COOLDOWN_SECONDS = float(os.getenv('BROWSER_RELAUNCH_COOLDOWN_SECONDS', 60)) # Пауза после неудачного запуска
+
+class RenderTimeout(Exception):
+    """Страница не загрузилась за отведенное время."""
+
+class RenderError(Exception):
+    """Сервис рендеринга вернул ошибку для страницы."""
+
+class RendererUnavailable(Exception):
+    """Браузер не запускается или сервис рендеринга недоступен: сбой инфраструктуры, а не страницы."""
+
+class RenderedPage:
+    """Итог рендера: финальный URL после редиректов, HTML, время загрузки и статистика."""
+    def __init__(self, url: str, html: str, elapsed: float = 0.0, stats: str = ''):
+        self.url = url
+        self.html = html
+        self.elapsed = elapsed # Время самой загрузки, без ожидания в очереди сервиса
+        self.stats = stats
+
+class LocalPageRenderer:
+    """
+    Собственный Chromium текущего процесса. Браузер запускается лениво,
+    при первом рендере, и перезапускается каждые BROWSER_MAX_RENDERS страниц.
+    Playwright sync API привязан к потоку: один рендерер — один поток.
+    """
+    def __init__(self, user_agent: Optional[str] = None, launch_args: Optional[list] = None):
+        self.user_agent = user_agent
+        self.launch_args = launch_args or []
+        self.request_policy = BrowserRequestPolicy()
+        self.launches = 0
+        self.renders = 0
+        self.last_stats = None
+        self._playwright = None
+        self._browser = None
+        self._renders_since_launch = 0
+        self._launch_error = None
+        self._launch_failed_at = 0.0
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._renders_since_launch >= BROWSER_MAX_RENDERS:
+            self._browser.close()
+            self._browser = None
+        if self._browser is None:
+            # Не перезапускаем сломанный Chromium на каждой странице: ошибка помнится до конца паузы
+            if self._launch_error and time.monotonic() - self._launch_failed_at < BROWSER_RELAUNCH_COOLDOWN_SECONDS:
+                raise RendererUnavailable(self._launch_error)
+            try:
+                with extraction_metrics.stage('browser_launch'):
+                    if self._playwright is None:
+                        self._playwright = sync_playwright().start()
+                    self._browser = self._playwright.chromium.launch(headless=True, args=self.launch_args)
+            except Exception as e:
+                first_line = (str(e).strip().splitlines() or [''])[0]
+                self._launch_error, self._launch_failed_at = f"браузер не запустился: {type(e).__name__}: {first_line}"[:300], time.monotonic()
+                self.close()
+                raise RendererUnavailable(self._launch_error) from e
+            self._launch_error = None
+            extraction_metrics.increment('browser_launches')
+            self.launches += 1
+            self._renders_since_launch = 0
+        return self._browser
+
+    def _browser_lost(self, error: Exception) -> RendererUnavailable:
+        """Браузер упал после запуска (OOM, убит системой): забываем его, следующий рендер запустит новый."""
+        try:
+            self._browser.close()
+        except PlaywrightError:
+            pass
+        self._browser = None
+        first_line = (str(error).strip().splitlines() or [''])[0]
+        return RendererUnavailable(f"браузер закрылся: {type(error).__name__}: {first_line}"[:300])
+
+    def render(self, url: str, timeout: float, settle_ms: int = 0) -> RenderedPage:
+        browser = self._ensure_browser()
+        try:
+            # Свежий контекст на каждую страницу: куки и кэш одного сайта не влияют на другой
+            context = browser.new_context(user_agent=self.user_agent) if self.user_agent else browser.new_context()
+            try:
+                page = context.new_page()
+            except PlaywrightError:
+                context.close()
+                raise
+        except PlaywrightError as e:
+            raise self._browser_lost(e) from e
+        try:
+            self.request_policy.attach(page)
+            self.request_policy.start_page(url)
+            try:
+                started = time.perf_counter()
+                page.goto(url, timeout=timeout * 1000, wait_until='domcontentloaded')
+                elapsed = time.perf_counter() - started
+                if settle_ms:
+                    page.wait_for_timeout(settle_ms)
+                rendered = RenderedPage(page.url, page.content(), elapsed)
+            except PlaywrightTimeoutError as e:
+                raise RenderTimeout(str(e)) from e
+            except PlaywrightError as e:
+                if not browser.is_connected():
+                    raise self._browser_lost(e) from e
+                raise
+            finally:
+                self.last_stats = str(self.request_policy.finish_page())
+        finally:
+            if browser.is_connected():
+                context.close()
+            self.renders += 1
+            self._renders_since_launch += 1
+        rendered.stats = self.last_stats
+        return rendered
+
+    def summary(self) -> str:
+        if not self.renders: return ''
+        return f"получено {self.request_policy.total_bytes / 1024:.0f} КБ, заблокировано запросов: {self.request_policy.total_blocked}"
+
+    def close(self):
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class RemotePageRenderer:
+    """Клиент общего сервиса рендеринга (services/render_service.py): свой браузер не запускается."""
+    def __init__(self, base_url: str = RENDER_SERVICE_URL):
+        self.base_url = base_url.rstrip('/')
+        self.renders = 0
+        self.last_stats = None
+
+    def render(self, url: str, timeout: float, settle_ms: int = 0) -> RenderedPage:
+        payload = {'url': url, 'timeout': timeout, 'settle_ms': settle_ms}
+        try:
+            # Ждем не только рендер, но и очередь сервиса
+            response = get_http_client().request('POST', f"{self.base_url}/render", json=payload,
+                                                 timeout=timeout + RENDER_QUEUE_WAIT_SECONDS + 5)
+        except requests.Timeout as e:
+            raise RenderTimeout(str(e)) from e
+        except requests.RequestException as e:
+            raise RendererUnavailable(f"сервис рендеринга недоступен: {e}") from e
+        data = response.json() if response.headers.get('Content-Type', '').startswith('application/json') else {}
+        if response.status_code == 504:
+            raise RenderTimeout(data.get('error', 'таймаут рендера'))
+        if data.get('unavailable'):
+            raise RendererUnavailable(data.get('error', 'браузеры сервиса рендеринга не запускаются'))
+        if response.status_code != 200:
+            raise RenderError(data.get('error', f"HTTP {response.status_code}"))
+        self.renders += 1
+        self.last_stats = data.get('stats', '')
+        return RenderedPage(data['final_url'], data['html'], data.get('elapsed', 0.0), self.last_stats)
+
+    def summary(self) -> str:
+        return f"страниц через сервис рендеринга: {self.renders}" if self.renders else ''
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_page_renderer(**kwargs):
+    """Общий сервис рендеринга, если задан RENDER_SERVICE_URL, иначе собственный браузер."""
+    return RemotePageRenderer(RENDER_SERVICE_URL) if RENDER_SERVICE_URL else LocalPageRenderer(**kwargs)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import hashlib
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional, Tuple
+
+import requests
+
+from services.http_client import get_http_client
+
+# --- Константы ---
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY_BYTES = int(os.getenv('PDF_SPOOL_MAX_MEMORY_MB', 4)) * 1024 * 1024
+MAX_PDF_SIZE_BYTES = int(os.getenv('MAX_PDF_SIZE_MB', 60)) * 1024 * 1024
+PDF_MAGIC = b'%PDF'
+PDF_MAGIC_SEARCH_WINDOW = 1024 # Спецификация допускает "мусор" перед сигнатурой
+HEDGE_STAGGER_SECONDS = float(os.getenv('PDF_HEDGE_STAGGER_SECONDS', 2.0))
+HEDGE_MAX_PARALLEL = int(os.getenv('PDF_HEDGE_MAX_PARALLEL', 3))
+REJECTED_CONTENT_TYPES = ('text/html', 'application/xhtml', 'text/plain', 'application/json', 'image/')
+TIMEOUT_REASON = "таймаут"
+DEADLINE_REASON = "исчерпан лимит времени"
+
+class SpooledPdf:
+    """
+    Скачанный PDF: держится в памяти, пока он небольшой, и переезжает
+    во временный файл, когда перерастает SPOOL_MAX_MEMORY_BYTES.
+    Отдает содержимое как memoryview без лишних копий (для файла — через mmap).
+    """
+    def __init__(self, url: str, max_memory: int = SPOOL_MAX_MEMORY_BYTES):
+        self.url = url
+        self.size = 0
+        self.response_seconds = None # Время до получения заголовков ответа
+        self._max_memory = max_memory
+        self._buffer = bytearray()
+        self._file = None
+        self._mmap = None
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk: bytes):
+        if self._file is None and self.size + len(chunk) > self._max_memory:
+            self._file = tempfile.TemporaryFile(prefix='curious_pdf_')
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.extend(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file is not None
+
+    def as_buffer(self) -> memoryview:
+        """Содержимое PDF для fitz.open(stream=...) без копирования."""
+        if self._file is None:
+            return memoryview(self._buffer)
+        if self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass # На буфер еще ссылается документ; сборщик мусора закроет его сам
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _is_rejected_content_type(content_type: str) -> bool:
+    content_type = (content_type or '').lower()
+    return any(content_type.startswith(rejected) for rejected in REJECTED_CONTENT_TYPES)
+
+def download_pdf(url: str, headers: dict, timeout: float, min_size: int = 0,
+                 max_size: int = MAX_PDF_SIZE_BYTES,
+                 cancel_event: Optional[threading.Event] = None,
+                 deadline: Optional[float] = None) -> Tuple[Optional[SpooledPdf], str]:
+    """
+    Потоково скачивает PDF с ранней проверкой Content-Type и сигнатуры %PDF.
+    Возвращает (SpooledPdf или None, причина отказа).
+    Не-PDF ответы (HTML-страницы ошибок и т.п.) обрываются после первого куска.
+    cancel_event позволяет прервать загрузку между кусками (см. download_first_pdf).
+    deadline (time.monotonic()) ограничивает всю загрузку: timeout у requests
+    действует на каждое чтение, а не на файл целиком.
+    """
+    pdf = None
+    try:
+        with get_http_client().get(url, headers=headers, timeout=timeout, stream=True, deadline=deadline) as response:
+            if response.status_code != 200:
+                return None, f"HTTP {response.status_code}"
+            content_type = response.headers.get('Content-Type', '')
+            if _is_rejected_content_type(content_type):
+                return None, f"Content-Type {content_type.split(';')[0]}"
+            declared_size = int(response.headers.get('Content-Length') or 0)
+            if declared_size > max_size:
+                return None, f"слишком большой файл ({declared_size} байт)"
+
+            pdf = SpooledPdf(response.url)
+            pdf.response_seconds = response.elapsed.total_seconds()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if cancel_event is not None and cancel_event.is_set():
+                    pdf.close()
+                    return None, "отменено"
+                if deadline is not None and time.monotonic() > deadline:
+                    pdf.close()
+                    return None, DEADLINE_REASON
+                if not chunk: continue
+                if pdf.size == 0 and PDF_MAGIC not in chunk[:PDF_MAGIC_SEARCH_WINDOW]:
+                    pdf.close()
+                    return None, "нет сигнатуры %PDF"
+                pdf.write(chunk)
+                if pdf.size > max_size:
+                    pdf.close()
+                    return None, f"превышен лимит {max_size} байт"
+
+        if pdf.size < min_size:
+            pdf.close()
+            return None, f"слишком маленький файл ({pdf.size} байт)"
+        if cancel_event is not None and cancel_event.is_set():
+            pdf.close()
+            return None, "отменено"
+        return pdf, ""
+    except requests.Timeout:
+        if pdf is not None: pdf.close()
+        return None, TIMEOUT_REASON
+    except (requests.RequestException, OSError, ValueError) as e:
+        if pdf is not None: pdf.close()
+        return None, f"ошибка загрузки: {e}"
+
+def _close_unclaimed_pdf(future):
+    if future.cancelled(): return
+    pdf, _ = future.result()
+    if pdf: pdf.close()
+
+def download_first_pdf(urls: List[str], headers: dict, timeout: float, min_size: int = 0,
+                       stagger_seconds: float = HEDGE_STAGGER_SECONDS,
+                       max_parallel: int = HEDGE_MAX_PARALLEL,
+                       deadline: Optional[float] = None) -> Tuple[Optional[SpooledPdf], Optional[str], List[Tuple[str, str]]]:
+    """
+    "Хеджированная" загрузка одного документа с нескольких зеркал.
+    Зеркала стартуют по очереди с задержкой stagger_seconds (следующее стартует
+    сразу, если все запущенные уже провалились); побеждает первый валидный PDF,
+    остальные загрузки отменяются.
+    Возвращает (SpooledPdf или None, URL победителя, [(URL, причина отказа)] остальных).
+    """
+    cancel_event = threading.Event()
+    futures, failures = {}, []
+    winner, winner_url = None, None
+
+    def harvest(done):
+        nonlocal winner, winner_url
+        for future in done:
+            url = futures.pop(future)
+            pdf, reason = future.result()
+            if pdf and winner is None:
+                winner, winner_url = pdf, url
+                cancel_event.set()
+            elif pdf:
+                pdf.close()
+            elif reason != "отменено":
+                failures.append((url, reason))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(urls), max_parallel)))
+    try:
+        for url in urls:
+            futures[executor.submit(download_pdf, url, headers, timeout, min_size,
+                                    cancel_event=cancel_event, deadline=deadline)] = url
+            # Даем запущенным зеркалам фору, прежде чем стартовать следующее
+            stagger_deadline = time.monotonic() + stagger_seconds
+            while futures and winner is None:
+                remaining = stagger_deadline - time.monotonic()
+                if remaining <= 0: break
+                done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done: break
+                harvest(done)
+            if winner is not None: break
+        while futures and winner is None:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            harvest(done)
+    finally:
+        cancel_event.set()
+        # Проигравшие загрузки не ждем: их буферы закроются по завершении
+        for future in futures:
+            future.add_done_callback(_close_unclaimed_pdf)
+        executor.shutdown(wait=False, cancel_futures=True)
+    return winner, winner_url, failures
+
+def probe_pdf(url: str, headers: dict, timeout: float, deadline: Optional[float] = None) -> bool:
+    """
+    Дешевая проверка, что по ссылке лежит PDF: запрашиваем только первый
+    килобайт (Range) и смотрим на Content-Type и сигнатуру %PDF.
+    """
+    probe_headers = dict(headers, Range=f'bytes=0-{PDF_MAGIC_SEARCH_WINDOW - 1}')
+    try:
+        with get_http_client().get(url, headers=probe_headers, timeout=timeout, stream=True, deadline=deadline) as response:
+            if response.status_code not in (200, 206):
+                return False
+            if _is_rejected_content_type(response.headers.get('Content-Type', '')):
+                return False
+            first_chunk = next(response.iter_content(chunk_size=PDF_MAGIC_SEARCH_WINDOW), b'')
+            return PDF_MAGIC in first_chunk[:PDF_MAGIC_SEARCH_WINDOW]
+    except (requests.RequestException, OSError, ValueError):
+        return False
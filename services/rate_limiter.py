@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+class TokenBucket:
+    """
+    Потокобезопасный "ведро с токенами": не больше rate_per_minute запросов
+    в минуту в среднем и не больше burst подряд. После ответа 429 все
+    потоки разом ставятся на паузу (cooldown), а не долбят API по очереди.
+    """
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now <= self._updated_at: return # Идет пауза после cooldown
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self) -> float:
+        """Ждет свободный токен. Возвращает, сколько секунд пришлось ждать."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate_per_second)
+            time.sleep(wait)
+            waited += wait
+
+    def cooldown(self, seconds: float):
+        """Приостанавливает выдачу токенов всем потокам на seconds (например, после 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # Токены начнут копиться только после паузы
+            self._tokens, self._updated_at = 0.0, self._paused_until
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+# --- Константы ---
+RAW_CACHE_DIR = os.getenv('RAW_CACHE_DIR', 'data/raw_cache')
+RAW_CACHE_MAX_BYTES = int(os.getenv('RAW_CACHE_MAX_MB', 2048)) * 1024 * 1024
+
+class RawDocumentCache:
+    """
+    Контентно-адресуемый дисковый кэш "сырых" документов (PDF и HTML-снимков).
+    Ключ — sha256 содержимого, файл лежит в <root>/<первые 2 символа>/<sha256>.
+    Размер ограничен max_bytes; при переполнении удаляются давно не читавшиеся
+    файлы (LRU по mtime, который обновляется при каждом чтении).
+    """
+    def __init__(self, root: str = RAW_CACHE_DIR, max_bytes: int = RAW_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = sum(path.stat().st_size for path in self._iter_files())
+
+    def _iter_files(self):
+        return (path for path in self.root.glob('??/*') if path.is_file() and not path.name.startswith('.'))
+
+    def _path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def put(self, data: Union[bytes, memoryview], sha256: Optional[str] = None) -> str:
+        """Сохраняет содержимое (если его еще нет) и возвращает его sha256."""
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        path = self._path_for(sha256)
+        with self._lock:
+            if path.exists():
+                os.utime(path)
+                return sha256
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Пишем во временный файл и атомарно переименовываем, чтобы не оставить "половинок"
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp_')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data)
+            self._evict_if_needed(keep=path)
+        return sha256
+
+    def get_path(self, sha256: Optional[str]) -> Optional[Path]:
+        """Возвращает путь к закэшированному документу и отмечает обращение к нему."""
+        if not sha256: return None
+        path = self._path_for(sha256)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def read(self, sha256: Optional[str]) -> Optional[bytes]:
+        path = self.get_path(sha256)
+        return path.read_bytes() if path else None
+
+    def _evict_if_needed(self, keep: Path):
+        if self._total_bytes <= self.max_bytes: return
+        entries = sorted(((p.stat().st_mtime, p.stat().st_size, p) for p in self._iter_files()), key=lambda e: e[0])
+        for _, size, path in entries:
+            if self._total_bytes <= self.max_bytes: break
+            if path == keep: continue
+            path.unlink(missing_ok=True)
+            self._total_bytes -= size
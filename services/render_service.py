@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from services.page_renderer import LocalPageRenderer, RenderTimeout, RendererUnavailable, RENDER_QUEUE_WAIT_SECONDS
+
+# --- Константы ---
+RENDER_SERVICE_HOST = os.getenv('RENDER_SERVICE_HOST', '127.0.0.1')
+RENDER_SERVICE_PORT = int(os.getenv('RENDER_SERVICE_PORT', 8931))
+RENDER_POOL_SIZE = int(os.getenv('RENDER_POOL_SIZE', 2)) # Сколько браузеров держит сервис
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', 32))
+MAX_RENDER_TIMEOUT = 60 # сек; клиенты не могут занять браузер дольше
+
+class RenderJob:
+    def __init__(self, url: str, timeout: float, settle_ms: int):
+        self.url = url
+        self.timeout = timeout
+        self.settle_ms = settle_ms
+        self.done = threading.Event()
+        self.abandoned = False # Клиент перестал ждать: браузер на задачу не тратим
+        self.result: Optional[dict] = None
+        self.status = 500
+
+class RenderService:
+    """
+    Общий пул браузеров для всех процессов проекта.
+    RENDER_POOL_SIZE рабочих потоков, у каждого свой LocalPageRenderer
+    (Playwright привязан к потоку), и одна ограниченная очередь задач.
+    Сколько бы процессов ни рендерило страницы, Chromium'ов не больше пула.
+    """
+    def __init__(self, pool_size: int = RENDER_POOL_SIZE, queue_size: int = RENDER_QUEUE_SIZE):
+        self.pool_size = pool_size
+        self.jobs: "queue.Queue[Optional[RenderJob]]" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.counters = {'rendered': 0, 'timeouts': 0, 'errors': 0, 'rejected': 0, 'abandoned': 0, 'browser_launches': 0}
+        self._workers = [threading.Thread(target=self._work, name=f"render-{i}", daemon=True) for i in range(pool_size)]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        for _ in self._workers:
+            self.jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def submit(self, url: str, timeout: float, settle_ms: int = 0) -> Optional[RenderJob]:
+        """Ставит задачу в очередь; None, если очередь переполнена."""
+        job = RenderJob(url, min(timeout, MAX_RENDER_TIMEOUT), settle_ms)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self._count('rejected')
+            return None
+        return job
+
+    def _work(self):
+        with LocalPageRenderer() as renderer:
+            while True:
+                job = self.jobs.get()
+                if job is None: return
+                if job.abandoned:
+                    self._count('abandoned'); continue
+                launches_before = renderer.launches
+                try:
+                    page = renderer.render(job.url, job.timeout, job.settle_ms)
+                    job.result = {'final_url': page.url, 'html': page.html, 'elapsed': page.elapsed, 'stats': page.stats}
+                    job.status = 200
+                    self._count('rendered')
+                except RenderTimeout as e:
+                    job.result, job.status = {'error': f"таймаут рендера: {e}"[:300]}, 504
+                    self._count('timeouts')
+                except RendererUnavailable as e:
+                    # Клиент должен отличать сломанный браузер от ошибки конкретной страницы
+                    job.result, job.status = {'error': str(e)[:300], 'unavailable': True}, 503
+                    self._count('errors')
+                except Exception as e:
+                    job.result, job.status = {'error': f"{type(e).__name__}: {e}"[:300]}, 502
+                    self._count('errors')
+                finally:
+                    self._count('browser_launches', renderer.launches - launches_before)
+                    job.done.set()
+
+    def health(self) -> dict:
+        with self._lock:
+            return dict(self.counters, pool_size=self.pool_size, queue_depth=self.jobs.qsize())
+
+def make_handler(service: RenderService):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                return self._reply(200, service.health())
+            self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/render':
+                return self._reply(404, {'error': 'not found'})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                url, timeout = payload['url'], float(payload.get('timeout', 30))
+            except (ValueError, KeyError) as e:
+                return self._reply(400, {'error': f"плохой запрос: {e}"})
+            job = service.submit(url, timeout, int(payload.get('settle_ms', 0)))
+            if job is None:
+                return self._reply(503, {'error': 'очередь рендеринга переполнена'})
+            if not job.done.wait(job.timeout + RENDER_QUEUE_WAIT_SECONDS):
+                job.abandoned = True
+                return self._reply(504, {'error': 'задача не дождалась свободного браузера'})
+            self._reply(job.status, job.result)
+
+        def _reply(self, status: int, data: dict):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass # Клиент ушел, не дождавшись ответа
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def serve(host: str = RENDER_SERVICE_HOST, port: int = RENDER_SERVICE_PORT,
+          pool_size: int = RENDER_POOL_SIZE, queue_size: int = RENDER_QUEUE_SIZE):
+    service = RenderService(pool_size, queue_size)
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    print(f"Сервис рендеринга слушает http://{host}:{port} (браузеров: {pool_size}, очередь: {queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Сервис рендеринга остановлен.")
+    finally:
+        server.server_close()
+        service.stop()
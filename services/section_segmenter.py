@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import re
+import json
+from typing import Iterable, List, Optional, Tuple
+
+# Заголовки разделов по типам. Порядок важен: при совпадении побеждает первая группа
+SECTION_HEADINGS = {
+    'abstract': ["abstract", "аннотация", "резюме"],
+    'introduction': ["introduction", "background", "motivation", "введение", "постановка проблемы"],
+    'literature': ["literature review", "related literature", "related work", "review of (?:the )?literature",
+                   "theoretical (?:background|framework)", "hypotheses development", "обзор литературы"],
+    'methods': ["data(?: and (?:methods?|methodology|sample))?", "methods?", "methodology", "research design",
+                "empirical (?:strategy|approach|model|framework)", "model", "experimental design", "sample",
+                "материалы и методы", "методы", "методология", "данные(?: и методы?)?"],
+    'results': ["results?", "findings", "empirical results", "main results", "robustness(?: checks?)?",
+                "результаты(?: исследования)?"],
+    'discussion': ["discussion", "обсуждение"],
+    'conclusion': ["conclusions?", "concluding remarks", "summary and conclusions?", "policy implications",
+                   "заключение", "выводы"],
+    'back_matter': ["references", "bibliography", "literature cited", "works cited", "acknowledge?ments?",
+                    "funding", "data availability(?: statement)?", "ethics statement", "author contributions",
+                    "conflicts? of interest", "declaration of competing interest", "competing interests",
+                    "supplementary (?:material|data)", "appendix(?: [a-z0-9])?", "publisher[’']s note",
+                    "список литературы", "литература", "благодарности", "приложение"],
+}
+BACK_MATTER_TYPES = frozenset({'back_matter'})
+
+_NUMBERING = r'(?:(?:\d{1,2}(?:\.\d{1,2})*|[IVX]{1,5})\.?|[A-H]\.)[ \t]+'
+_KEYWORDS = '|'.join(f"(?P<{kind}>{'|'.join(words)})" for kind, words in SECTION_HEADINGS.items())
+# Заголовок — отдельная строка. Ненумерованный должен целиком состоять из ключевой фразы
+# (плюс короткий хвост вида "and ..."), иначе строка "Results show that ..." сошла бы за заголовок
+HEADING_PATTERN = re.compile(
+    rf'^[ \t]*(?:{_NUMBERING}(?:{_KEYWORDS})\b[^\n.;]{{0,60}}'
+    rf'|(?:{_KEYWORDS.replace("?P<", "?P<u_")})(?:[ \t]+(?:and|&|of|for|и)[ \t]+[^\n.,;]{{1,40}})?[ \t]*:?)[ \t]*$',
+    re.IGNORECASE | re.MULTILINE,
+)
+# Если заголовков нет (текст склеен в одну строку), хвост отрезается по последнему упоминанию списка литературы
+TRAILING_REFERENCES = re.compile(r'\b(?:References|Bibliography|Список литературы)\b', re.IGNORECASE)
+TRAILING_REFERENCES_MIN_POSITION = 0.5 # Доля текста, раньше которой "References" хвостом не считаем
+
+def _section_type(match: re.Match) -> str:
+    kind = match.lastgroup or 'body'
+    return kind[2:] if kind.startswith('u_') else kind
+
+def segment_sections(text: str) -> List[dict]:
+    """
+    Один проход по тексту: находит строки-заголовки и делит текст на разделы
+    [{'type', 'heading', 'start', 'end'}]. Текст до первого заголовка — 'front'.
+    """
+    if not text:
+        return []
+    sections, position, kind, heading = [], 0, 'front', ''
+    for match in HEADING_PATTERN.finditer(text):
+        sections.append({'type': kind, 'heading': heading, 'start': position, 'end': match.start()})
+        position, kind, heading = match.start(), _section_type(match), match.group(0).strip()
+    sections.append({'type': kind, 'heading': heading, 'start': position, 'end': len(text)})
+    return [section for section in sections if section['end'] > section['start']]
+
+def segment_and_clean(text: str) -> Tuple[str, List[dict]]:
+    """
+    Убирает разделы "хвоста" (литература, благодарности, финансирование и т.п.)
+    и возвращает очищенный текст вместе с разделами, пересчитанными под него.
+    """
+    if not text:
+        return "", []
+    sections = segment_sections(text)
+    if not any(section['type'] != 'front' for section in sections):
+        # Заголовков нет: старое правило, но только для хвоста второй половины текста
+        tail = None
+        for tail in TRAILING_REFERENCES.finditer(text):
+            pass
+        if tail and tail.start() >= len(text) * TRAILING_REFERENCES_MIN_POSITION:
+            text = text[:tail.start()]
+        return text, [{'type': 'body', 'heading': '', 'start': 0, 'end': len(text)}]
+
+    parts, cleaned_sections, offset = [], [], 0
+    for section in sections:
+        if section['type'] in BACK_MATTER_TYPES:
+            continue
+        part = text[section['start']:section['end']]
+        parts.append(part)
+        cleaned_sections.append(dict(section, start=offset, end=offset + len(part)))
+        offset += len(part)
+    return "".join(parts), cleaned_sections
+
+def sections_from_json(raw: Optional[str]) -> List[dict]:
+    try:
+        return json.loads(raw) if raw else []
+    except ValueError:
+        return []
+
+def select_sections(text: str, sections: List[dict], types: Iterable[str]) -> str:
+    """Текст только нужных разделов в исходном порядке; без разметки — весь текст."""
+    wanted = set(types)
+    selected = [text[section['start']:section['end']] for section in sections if section['type'] in wanted]
+    return "".join(selected) if selected else text
@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import os
-from datetime import datetime, timezone
-from typing import List, Union
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Union
 import json
 import re
 
-from sqlalchemy import create_engine, Column, String, Integer, Text, DateTime, BigInteger, func
+from sqlalchemy import create_engine, inspect, insert, text, Column, String, Integer, Float, Text, DateTime, BigInteger, func
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 Base = declarative_base()
@@ -33,22 +33,96 @@ class Article(Base):
     summary = Column(Text, nullable=True)
     original_abstract = Column(Text, nullable=True)
     full_text = Column(Text, nullable=True)
+    sections = Column(Text, nullable=True) # JSON-разметка разделов full_text (см. services/section_segmenter.py)
     full_metadata = Column(Text)
     theme_name = Column(String, nullable=True)
     moderation_message_id = Column(BigInteger, nullable=True)
+    raw_pdf_sha256 = Column(String(64), nullable=True)
+    raw_html_sha256 = Column(String(64), nullable=True)
+    extraction_deferrals = Column(Integer, default=0)
     date_added = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
         return f"<Article(id='{self.id}', title='{self.title[:30]}...', status='{self.status}')>"
 
+class UrlResolution(Base):
+    """Кэш разрешения ссылок: стартовый URL (обычно DOI) -> страница статьи -> PDF."""
+    __tablename__ = 'url_resolutions'
+    start_url = Column(String, primary_key=True)
+    landing_url = Column(String, nullable=True)
+    pdf_url = Column(String, nullable=True)
+    hop_chain = Column(Text, nullable=True) # JSON-список пройденных URL
+    resolved_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_used_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<UrlResolution(start_url='{self.start_url}', pdf_url='{self.pdf_url}')>"
+
+class RewriteRuleStat(Base):
+    """Статистика попаданий правил из rules/pdf_url_rewrites.yaml."""
+    __tablename__ = 'rewrite_rule_stats'
+    rule_name = Column(String, primary_key=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    last_hit_at = Column(DateTime, nullable=True)
+
+class HostStat(Base):
+    """Задержки и таймауты хостов издательств (см. services/host_timeouts.py)."""
+    __tablename__ = 'host_stats'
+    host = Column(String, primary_key=True)
+    latency_histogram = Column(Text, nullable=True) # JSON-список счетчиков по корзинам
+    consecutive_timeouts = Column(Integer, default=0, nullable=False)
+    backoff_until = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class CompletionCacheEntry(Base):
+    """Кэш ответов LLM: ключ — хэш промпта, модели и параметров (см. services/completion_cache.py)."""
+    __tablename__ = 'llm_completion_cache'
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    completion = Column(Text, nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+class LlmCall(Base):
+    """Журнал вызовов LLM (только добавление): пишется пачками из services/llm_telemetry.py."""
+    __tablename__ = 'llm_calls'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    article_id = Column(String, nullable=True, index=True)
+    template = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    latency_ms = Column(Float, default=0, nullable=False)
+    ttft_ms = Column(Float, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    outcome = Column(String, nullable=False) # ok, cut, cache_hit, empty, error, circuit_open
+    error = Column(String, nullable=True)
+
 class StorageService:
     def __init__(self, db_url: str = 'sqlite:///data/articles.db'):
         db_path = db_url.replace('sqlite:///', '')
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.engine = create_engine(db_url)
         Base.metadata.create_all(self.engine)
+        self._add_missing_columns()
         self.Session = sessionmaker(bind=self.engine)
 
+    def _add_missing_columns(self):
+        """Досоздает в существующей БД колонки, появившиеся в моделях позже (create_all их не добавляет)."""
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
     # --- КЛЮЧЕВОЕ ИЗМЕНЕНИЕ: Внедрена логика "Интеллектуального слияния" ---
     def add_article(self, article_data: dict, theme_name: str) -> str | None:
         """
@@ -76,6 +150,7 @@ class StorageService:
                 new_url = article_data.get('content_url')
                 if new_url and not existing_by_title.content_url:
                     existing_by_title.content_url = new_url
+                    existing_by_title.content_type = article_data.get('content_type')
                     is_enriched = True
 
                 # 2. Слияние аннотации (выбираем более длинную)
@@ -106,6 +181,7 @@ class StorageService:
                 'normalized_title': norm_title,
                 'source_name': article_data.get('source_name'),
                 'status': 'new',
+                'content_type': article_data.get('content_type'),
                 'content_url': article_data.get('content_url'),
                 'doi': article_data.get('doi'),
                 'year': article_data.get('year'),
@@ -152,6 +228,46 @@ class StorageService:
         finally:
             session.close()
 
+    def get_article_counts_by_status(self) -> Dict[str, int]:
+        """Число статей по всем статусам одним GROUP BY (статусы без статей отсутствуют)."""
+        session = self.Session()
+        try:
+            rows = session.query(Article.status, func.count(Article.id)).group_by(Article.status).all()
+            return {status: count for status, count in rows}
+        finally:
+            session.close()
+
+    def get_article_counts_by_theme(self, status: str) -> Dict[str | None, int]:
+        """Число статей с данным статусом по темам (один GROUP BY)."""
+        session = self.Session()
+        try:
+            rows = (session.query(Article.theme_name, func.count(Article.id))
+                    .filter(Article.status == status).group_by(Article.theme_name).all())
+            return {theme_name: count for theme_name, count in rows}
+        finally:
+            session.close()
+
+    def get_article_queue(self, statuses: List[str]) -> List[tuple]:
+        """Легкие строки очереди (id, theme_name, status, year, date_added) без текстов — для планировщика."""
+        session = self.Session()
+        try:
+            return (session.query(Article.id, Article.theme_name, Article.status, Article.year, Article.date_added)
+                    .filter(Article.status.in_(statuses)).all())
+        finally:
+            session.close()
+
+    def get_articles_by_ids(self, article_ids: List[str]) -> List[Article]:
+        """Статьи по списку id в том же порядке (отсутствующие пропускаются)."""
+        session = self.Session()
+        try:
+            found = {}
+            for start in range(0, len(article_ids), 500): # Лимит переменных в запросе SQLite
+                for article in session.query(Article).filter(Article.id.in_(article_ids[start:start + 500])):
+                    found[article.id] = article
+            return [found[article_id] for article_id in article_ids if article_id in found]
+        finally:
+            session.close()
+
     def get_article_by_id(self, article_id: str) -> Article | None:
         session = self.Session()
         try:
@@ -184,12 +300,14 @@ class StorageService:
         finally:
             session.close()
 
-    def update_article_text(self, article_id: str, text: str) -> bool:
+    def update_article_text(self, article_id: str, text: str, sections: List[dict] | None = None) -> bool:
+        """Сохраняет полный текст; разметка разделов от прежнего текста при этом сбрасывается."""
         session = self.Session()
         try:
             article = session.query(Article).filter_by(id=article_id).first()
             if article:
                 article.full_text = text
+                article.sections = json.dumps(sections, ensure_ascii=False) if sections else None
                 session.commit()
                 return True
             return False
@@ -219,3 +337,185 @@ class StorageService:
             return False
         finally:
             session.close()
+
+    def update_article_raw_documents(self, article_id: str, pdf_sha256: str | None = None, html_sha256: str | None = None) -> bool:
+        """Привязывает к статье закэшированные "сырые" документы (см. RawDocumentCache)."""
+        session = self.Session()
+        try:
+            article = session.query(Article).filter_by(id=article_id).first()
+            if article:
+                if pdf_sha256: article.raw_pdf_sha256 = pdf_sha256
+                if html_sha256: article.raw_html_sha256 = html_sha256
+                session.commit()
+                return True
+            return False
+        finally:
+            session.close()
+
+    def get_articles_with_raw_documents(self, statuses: List[str], limit: int = 1000) -> List[Article]:
+        session = self.Session()
+        try:
+            return session.query(Article).filter(
+                Article.status.in_(statuses),
+                (Article.raw_pdf_sha256.isnot(None)) | (Article.raw_html_sha256.isnot(None))
+            ).order_by(Article.date_added.asc()).limit(limit).all()
+        finally:
+            session.close()
+
+    def get_url_resolution(self, start_url: str, max_age: timedelta) -> UrlResolution | None:
+        """Возвращает неустаревшую запись кэша разрешения ссылок и отмечает ее использование."""
+        session = self.Session()
+        try:
+            resolution = session.query(UrlResolution).filter_by(start_url=start_url).first()
+            if not resolution:
+                return None
+            # SQLite возвращает naive datetime, хотя пишем мы в UTC
+            resolved_at = resolution.resolved_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - resolved_at > max_age:
+                return None
+            resolution.last_used_at = datetime.now(timezone.utc)
+            session.commit()
+            session.refresh(resolution)
+            return resolution
+        finally:
+            session.close()
+
+    def save_url_resolution(self, start_url: str, landing_url: str | None, pdf_url: str | None, hop_chain: List[str]) -> None:
+        session = self.Session()
+        try:
+            session.merge(UrlResolution(
+                start_url=start_url, landing_url=landing_url, pdf_url=pdf_url,
+                hop_chain=json.dumps(hop_chain), resolved_at=datetime.now(timezone.utc)
+            ))
+            session.commit()
+        finally:
+            session.close()
+
+    def delete_url_resolution(self, start_url: str) -> None:
+        session = self.Session()
+        try:
+            session.query(UrlResolution).filter_by(start_url=start_url).delete()
+            session.commit()
+        finally:
+            session.close()
+
+    def record_rewrite_rule_result(self, rule_name: str, is_hit: bool) -> None:
+        session = self.Session()
+        try:
+            stat = session.query(RewriteRuleStat).filter_by(rule_name=rule_name).first()
+            if not stat:
+                stat = RewriteRuleStat(rule_name=rule_name, attempts=0, hits=0)
+                session.add(stat)
+            stat.attempts += 1
+            if is_hit:
+                stat.hits += 1
+                stat.last_hit_at = datetime.now(timezone.utc)
+            session.commit()
+        finally:
+            session.close()
+
+    def get_rewrite_rule_stats(self) -> List[RewriteRuleStat]:
+        session = self.Session()
+        try:
+            return session.query(RewriteRuleStat).order_by(RewriteRuleStat.hits.desc()).all()
+        finally:
+            session.close()
+
+    def get_host_stat(self, host: str) -> HostStat | None:
+        session = self.Session()
+        try:
+            return session.query(HostStat).filter_by(host=host).first()
+        finally:
+            session.close()
+
+    def save_host_stat(self, host: str, latency_histogram: str, consecutive_timeouts: int, backoff_until: datetime | None) -> None:
+        session = self.Session()
+        try:
+            session.merge(HostStat(
+                host=host, latency_histogram=latency_histogram, consecutive_timeouts=consecutive_timeouts,
+                backoff_until=backoff_until, updated_at=datetime.now(timezone.utc)
+            ))
+            session.commit()
+        finally:
+            session.close()
+
+    def defer_article_extraction(self, article_id: str) -> int:
+        """Возвращает статью в очередь экстрактора ('new') и возвращает число ее отсрочек."""
+        session = self.Session()
+        try:
+            article = session.query(Article).filter_by(id=article_id).first()
+            if not article:
+                return 0
+            article.status = 'new'
+            article.extraction_deferrals = (article.extraction_deferrals or 0) + 1
+            session.commit()
+            return article.extraction_deferrals
+        finally:
+            session.close()
+
+    def reset_extraction_deferrals(self, article_id: str) -> None:
+        """Обнуляет счетчик отсрочек, когда попытка извлечения доведена до конца."""
+        session = self.Session()
+        try:
+            session.query(Article).filter_by(id=article_id).update({'extraction_deferrals': 0})
+            session.commit()
+        finally:
+            session.close()
+
+    def get_cached_completion(self, key: str, max_age: timedelta | None = None) -> CompletionCacheEntry | None:
+        """Возвращает запись кэша LLM и отмечает попадание; просроченную запись удаляет."""
+        session = self.Session()
+        try:
+            entry = session.query(CompletionCacheEntry).filter_by(key=key).first()
+            if not entry:
+                return None
+            now = datetime.now(timezone.utc)
+            if max_age and entry.created_at.replace(tzinfo=timezone.utc) < now - max_age:
+                session.delete(entry)
+                session.commit()
+                return None
+            entry.hits += 1
+            entry.last_used_at = now
+            session.commit()
+            session.refresh(entry)
+            return entry
+        finally:
+            session.close()
+
+    def save_cached_completion(self, key: str, model: str, completion: str, prompt_tokens: int, completion_tokens: int, max_entries: int | None = None) -> None:
+        """Сохраняет ответ LLM в кэш; сверх max_entries вытесняет давно не использованные записи."""
+        session = self.Session()
+        try:
+            now = datetime.now(timezone.utc)
+            session.merge(CompletionCacheEntry(
+                key=key, model=model, completion=completion, prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens, hits=0, created_at=now, last_used_at=now
+            ))
+            session.flush()
+            if max_entries:
+                overflow = session.query(func.count(CompletionCacheEntry.key)).scalar() - max_entries
+                if overflow > 0:
+                    stale_keys = [row.key for row in session.query(CompletionCacheEntry.key)
+                                  .order_by(CompletionCacheEntry.last_used_at).limit(overflow)]
+                    session.query(CompletionCacheEntry).filter(CompletionCacheEntry.key.in_(stale_keys)).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def add_llm_calls(self, rows: List[dict]) -> None:
+        """Добавляет пачку записей журнала вызовов LLM одним INSERT."""
+        if not rows:
+            return
+        with self.engine.begin() as connection:
+            connection.execute(insert(LlmCall), rows)
+
+    def get_llm_calls(self, since: datetime) -> List[tuple]:
+        """Записи журнала вызовов LLM с указанного момента: (LlmCall, тема статьи, статус статьи)."""
+        session = self.Session()
+        try:
+            return (session.query(LlmCall, Article.theme_name, Article.status)
+                    .outerjoin(Article, Article.id == LlmCall.article_id)
+                    .filter(LlmCall.created_at >= since)
+                    .order_by(LlmCall.created_at).all())
+        finally:
+            session.close()
@@ -1,19 +1,17 @@
 # -*- coding: utf-8 -*-
 
-import os
-from gigachat import GigaChat
-from gigachat.models import Chat
 from typing import Optional
 
+from services.giga_service import GigaService, RetriesExhausted
+from services.circuit_breaker import CircuitOpen
+
 class GigaChatSummarizer:
     """
     Сервис для создания качественной, стилизованной выжимки из текста с использованием API GigaChat.
     """
     def __init__(self):
-        credentials = os.getenv('GIGACHAT_CREDENTIALS')
-        if not credentials:
-            raise ValueError("Не найден GIGACHAT_CREDENTIALS в переменных окружения!")
-        self.giga = GigaChat(credentials=credentials, verify_ssl_certs=False)
+        # Общий клиент, лимитер и предохранитель GigaService, а не отдельное подключение
+        self.giga = GigaService()
 
     def summarize_abstract(self, abstract: str) -> Optional[str]:
         """
@@ -53,22 +51,12 @@ class GigaChatSummarizer:
             f"\"\"\"\n{abstract}\n\"\"\""
         )
 
+        print("   -> Отправка запроса в GigaChat API для стилизованной суммаризации...")
         try:
-            print("   -> Отправка запроса в GigaChat API для стилизованной суммаризации...")
-            
-            payload = Chat(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.6,
-                max_tokens=350,
-            )
-            response = self.giga.chat(payload)
-            
-            summary = response.choices[0].message.content.strip()
-            print("   -> Стилизованная суммаризация успешно получена.")
-            return summary
-        except Exception as e:
-            print(f"❌ Ошибка при обращении к GigaChat API: {e}")
+            summary = self.giga.get_completion(user_prompt, temperature=0.6, max_tokens=350, system_prompt=system_prompt)
+        except (CircuitOpen, RetriesExhausted) as e:
+            print(f"❌ {e}")
             return None
+        if summary:
+            print("   -> Стилизованная суммаризация успешно получена.")
+        return summary
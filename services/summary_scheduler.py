@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# --- Константы ---
+SUMMARY_CYCLE_LIMIT = int(os.getenv('SUMMARY_CYCLE_LIMIT', 1000)) # Статей за один цикл суммаризации
+SUMMARY_REVIEW_TARGET = int(os.getenv('SUMMARY_REVIEW_TARGET', 5)) # Сколько готовых постов на тему держим в awaiting_review
+SUMMARY_THEME_QUOTA = int(os.getenv('SUMMARY_THEME_QUOTA', 0)) # Потолок статей одной темы за цикл, 0 — без ограничения
+SUMMARY_FRESHNESS_HALF_LIFE_DAYS = float(os.getenv('SUMMARY_FRESHNESS_HALF_LIFE_DAYS', 14))
+SUMMARY_ABSTRACT_WEIGHT = float(os.getenv('SUMMARY_ABSTRACT_WEIGHT', 0.8)) # Вес поста по аннотации относительно пересказа полного текста
+
+def priority_score(candidate, now: datetime) -> float:
+    """
+    Приоритет статьи внутри темы: свежесть (полураспад по дате добавления,
+    штраф за старый год публикации), умноженная на вес типа выжимки.
+    """
+    added = candidate.date_added or now
+    if added.tzinfo is None:
+        added = added.replace(tzinfo=timezone.utc) # SQLite возвращает даты без зоны
+    age_days = max(0.0, (now - added).total_seconds() / 86400)
+    score = 0.5 ** (age_days / SUMMARY_FRESHNESS_HALF_LIFE_DAYS) if SUMMARY_FRESHNESS_HALF_LIFE_DAYS > 0 else 1.0
+    if candidate.year:
+        score /= 1 + max(0, now.year - 1 - candidate.year)
+    if candidate.status == 'awaiting_abstract_summary':
+        score *= SUMMARY_ABSTRACT_WEIGHT
+    return score
+
+def schedule_summaries(candidates: list, review_depth: Dict[Optional[str], int], limit: int = SUMMARY_CYCLE_LIMIT,
+                       target: int = SUMMARY_REVIEW_TARGET, quota: int = SUMMARY_THEME_QUOTA,
+                       now: Optional[datetime] = None) -> list:
+    """
+    Порядок суммаризации вместо date_added ASC. Сначала по кругу набирается
+    следующая пачка для модераторов: темам, у которых в awaiting_review меньше
+    target постов, — по одной лучшей статье за круг, самым "голодным" темам первыми
+    (при равной глубине — теме с самой свежей статьей).
+    Остальное идет по убыванию приоритета. quota ограничивает долю одной темы в цикле.
+    candidates — объекты с полями id, theme_name, status, year, date_added.
+    """
+    now = now or datetime.now(timezone.utc)
+    queues = defaultdict(list)
+    for candidate in candidates:
+        queues[candidate.theme_name].append((priority_score(candidate, now), candidate))
+    for queue in queues.values():
+        queue.sort(key=lambda item: item[0], reverse=True)
+
+    cap = quota if quota > 0 else limit
+    taken = defaultdict(int)
+    order = []
+    hungry = sorted((theme for theme in queues if review_depth.get(theme, 0) < target),
+                    key=lambda theme: (review_depth.get(theme, 0), -queues[theme][0][0]))
+    while hungry and len(order) < limit:
+        for theme in list(hungry):
+            order.append(queues[theme][taken[theme]][1])
+            taken[theme] += 1
+            if (taken[theme] >= len(queues[theme]) or taken[theme] >= cap
+                    or review_depth.get(theme, 0) + taken[theme] >= target):
+                hungry.remove(theme)
+            if len(order) >= limit:
+                break
+
+    rest = [item for theme, queue in queues.items() for item in queue[taken[theme]:]]
+    rest.sort(key=lambda item: item[0], reverse=True)
+    for _, candidate in rest:
+        if len(order) >= limit:
+            break
+        if taken[candidate.theme_name] < cap:
+            order.append(candidate)
+            taken[candidate.theme_name] += 1
+    return order
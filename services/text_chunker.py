@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import re
+from typing import List
+
+# --- Константы ---
+# Грубая оценка для смеси русского и английского текста; точный подсчет потребовал бы вызова API
+CHARS_PER_TOKEN = 3.5
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text or "") / CHARS_PER_TOKEN) + 1
+
+def _split_oversized(piece: str, max_chars: int) -> List[str]:
+    """Режет слишком длинный абзац по предложениям, а слишком длинное предложение — по символам."""
+    parts = []
+    for sentence in SENTENCE_BREAK.split(piece):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            parts.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            parts.append(sentence)
+    return parts
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Делит текст на куски не больше max_tokens (по оценке estimate_tokens),
+    не разрывая абзацы и предложения без необходимости: соседние абзацы
+    склеиваются жадно, пока помещаются в бюджет.
+    """
+    max_chars = max(1, int(max_tokens * CHARS_PER_TOKEN))
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK.split(text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces.extend([paragraph] if len(paragraph) <= max_chars else _split_oversized(paragraph, max_chars))
+
+    chunks, current, current_len = [], [], 0
+    for piece in pieces:
+        if current and current_len + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current, current_len = [], 0
+        current.append(piece)
+        current_len += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
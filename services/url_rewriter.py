@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import re
+import string
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import yaml
+
+from services.pdf_downloader import probe_pdf
+
+# --- Константы ---
+RULES_PATH = Path(__file__).resolve().parent.parent / 'rules' / 'pdf_url_rewrites.yaml'
+
+class RewriteRule:
+    """Одно правило из rules/pdf_url_rewrites.yaml."""
+    def __init__(self, name: str, host: str, path: str, rewrite: str):
+        self.name = name
+        self.host = re.compile(host, re.IGNORECASE)
+        self.path = re.compile(path)
+        self.rewrite = rewrite
+        # Шаблон может ссылаться только на именованные группы path и на scheme/host
+        fields = {field for _, field, _, _ in string.Formatter().parse(rewrite) if field is not None}
+        unknown = fields - set(self.path.groupindex) - {'scheme', 'host'}
+        if unknown:
+            raise ValueError(f"шаблон ссылается на несуществующие группы: {', '.join(sorted(unknown))}")
+
+    def apply(self, url: str) -> Optional[str]:
+        parts = urlsplit(url)
+        if not self.host.fullmatch(parts.hostname or ''):
+            return None
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+        match = self.path.fullmatch(path)
+        if not match:
+            return None
+        try:
+            return self.rewrite.format(scheme=parts.scheme, host=parts.netloc, **match.groupdict(default=''))
+        except (KeyError, IndexError, ValueError) as e:
+            # Одно сломанное правило не должно обрывать цикл извлечения
+            print(f"   -> ВНИМАНИЕ: Правило переписывания {self.name} не применилось: {e!r}")
+            return None
+
+def load_rewrite_rules(rules_path: Path = RULES_PATH) -> List[RewriteRule]:
+    """Загружает и компилирует правила; некорректные правила пропускаются с предупреждением."""
+    try:
+        with open(rules_path, 'r', encoding='utf-8') as f:
+            raw_rules = (yaml.safe_load(f) or {}).get('rules', [])
+    except FileNotFoundError:
+        print(f"   -> ВНИМАНИЕ: Файл правил переписывания ссылок не найден: {rules_path}")
+        return []
+
+    rules = []
+    for raw_rule in raw_rules:
+        try:
+            rules.append(RewriteRule(raw_rule['name'], raw_rule['host'], raw_rule['path'], raw_rule['rewrite']))
+        except (KeyError, ValueError, re.error) as e:
+            print(f"   -> ВНИМАНИЕ: Некорректное правило переписывания {raw_rule.get('name', '?')}: {e}")
+    return rules
+
+class UrlRewriter:
+    """
+    Превращает страницу статьи или DOI в прямую ссылку на PDF по таблице правил,
+    проверяя кандидатов дешевым Range-запросом. Попадания и промахи каждого
+    правила копятся в БД (таблица rewrite_rule_stats).
+    """
+    def __init__(self, storage, headers: dict, timeout: float, rules: Optional[List[RewriteRule]] = None):
+        self.storage = storage
+        self.headers = headers
+        self.timeout = timeout
+        self.rules = rules if rules is not None else load_rewrite_rules()
+
+    def candidates(self, url: str) -> List[Tuple[str, str]]:
+        """Все (имя правила, кандидат) для URL в порядке следования правил."""
+        result, seen = [], {url}
+        for rule in self.rules:
+            candidate = rule.apply(url)
+            if candidate and candidate not in seen:
+                result.append((rule.name, candidate))
+                seen.add(candidate)
+        return result
+
+    def find_pdf_url(self, url: str, timeout: Optional[float] = None, deadline: Optional[float] = None) -> Optional[str]:
+        """Возвращает первый кандидат, по которому действительно отдается PDF."""
+        for rule_name, candidate in self.candidates(url):
+            is_pdf = probe_pdf(candidate, self.headers, timeout or self.timeout, deadline=deadline)
+            self.storage.record_rewrite_rule_result(rule_name, is_pdf)
+            if is_pdf:
+                print(f"    -> Правило '{rule_name}' дало прямую ссылку на PDF: {candidate[:90]}")
+                return candidate
+        return None
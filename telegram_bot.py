@@ -18,6 +18,7 @@ load_dotenv(dotenv_path=dotenv_path)
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, ApplicationBuilder, ContextTypes, CallbackQueryHandler, CommandHandler
 from services.storage_service import StorageService
+from services.async_storage import AsyncStorageService
 
 # --- Настройка ---
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
@@ -29,14 +30,15 @@ WORKFLOW_CHANNEL_ID = os.getenv("WORKFLOW_CHANNEL_ID")
 PUBLISH_CHANNEL_ID = os.getenv("PUBLISH_CHANNEL_ID")
 MODERATION_BATCH_SIZE = int(os.getenv("MODERATION_BATCH_SIZE", 10))
 
-storage = StorageService()
+# Все обращения к БД из обработчиков идут через пул потоков, не блокируя цикл событий бота
+storage = AsyncStorageService(StorageService())
 
 # --- КОНВЕЙЕРЫ (ТРИГГЕРЫ) ---
 
 async def trigger_triage_conveyor(app: Application):
     """Отправляет статьи на ОТСЕВ в РАБОЧИЙ канал."""
     logger.info("Запущен конвейер ОТСЕВА по триггеру...")
-    articles = storage.get_articles_by_status('investigated', limit=MODERATION_BATCH_SIZE, random_order=True)
+    articles = await storage.get_articles_by_status('investigated', limit=MODERATION_BATCH_SIZE, random_order=True)
     if not articles:
         logger.info("...статей на отсев не найдено.")
         return
@@ -62,15 +64,15 @@ async def trigger_triage_conveyor(app: Application):
                 reply_markup=reply_markup,
                 disable_web_page_preview=True
             )
-            storage.update_moderation_message_id(article.id, sent_message.message_id)
-            storage.update_article_status(article.id, 'awaiting_triage')
+            await storage.update_moderation_message_id(article.id, sent_message.message_id)
+            await storage.update_article_status(article.id, 'awaiting_triage')
         except Exception as e:
             logger.error(f"Ошибка при отправке статьи на отсев {article.id}: {e}", exc_info=True)
 
 async def trigger_review_conveyor(app: Application):
     """Отправляет статьи на УТВЕРЖДЕНИЕ в РАБОЧИЙ канал."""
     logger.info("Запущен конвейер УТВЕРЖДЕНИЯ по триггеру...")
-    articles = storage.get_articles_by_status('awaiting_review', limit=MODERATION_BATCH_SIZE, random_order=True)
+    articles = await storage.get_articles_by_status('awaiting_review', limit=MODERATION_BATCH_SIZE, random_order=True)
     if not articles:
         logger.info("...статей на утверждение не найдено.")
         return
@@ -100,7 +102,7 @@ async def trigger_review_conveyor(app: Application):
                 text=message_text, parse_mode='HTML', reply_markup=reply_markup,
                 disable_web_page_preview=True
             )
-            storage.update_article_status(article.id, 'awaiting_publication')
+            await storage.update_article_status(article.id, 'awaiting_publication')
         except Exception as e:
             logger.error(f"Ошибка при отправке статьи на утверждение {article.id}: {e}", exc_info=True)
 
@@ -134,9 +136,9 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
             all_statuses = ['new', 'investigated', 'awaiting_triage', 'triage_rejected',
                             'awaiting_parsing', 'awaiting_abstract_summary', 'extraction_failed',
                             'awaiting_review', 'awaiting_publication', 'review_rejected', 'published']
+            counts = await storage.get_article_counts_by_status()
             for status in all_statuses:
-                count = storage.get_article_count_by_status(status)
-                status_message += f"• `{status}`: {count} статей\n"
+                status_message += f"• `{status}`: {counts.get(status, 0)} статей\n"
             await query.edit_message_text(text=status_message, parse_mode='Markdown')
         else:
             parts = data.split('_')
@@ -144,17 +146,17 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
 
             if prefix == "triage":
                 if action == "accept":
-                    article = storage.get_article_by_id(article_id)
+                    article = await storage.get_article_by_id(article_id)
                     if not article: return
                     next_status = 'awaiting_parsing' if article.content_type == 'pdf' else 'awaiting_abstract_summary'
-                    storage.update_article_status(article.id, next_status)
+                    await storage.update_article_status(article.id, next_status)
                     await query.edit_message_text(text=f"✅ <b>ПРИНЯТО.</b>\nСтатья отправлена на этап: `{next_status}`", parse_mode='HTML')
                 elif action == "reject":
-                    storage.update_article_status(article_id, 'triage_rejected')
+                    await storage.update_article_status(article_id, 'triage_rejected')
                     await query.edit_message_text(text="❌ <b>ОТКЛОНЕНО.</b>", parse_mode='HTML')
                     
             elif prefix == "publish":
-                article = storage.get_article_by_id(article_id)
+                article = await storage.get_article_by_id(article_id)
                 if not article: return
                 if action == "approve":
                     hashtag = f"#{re.sub(r'[^a-zA-Z0-9а-яА-Я_]', '', article.theme_name.replace(' ', '_'))}" if article.theme_name else ""
@@ -163,18 +165,21 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
                                  f"{article.summary}\n\n" + \
                                  f"<a href='{article.doi}'>Источник</a>"
                     await context.bot.send_message(chat_id=PUBLISH_CHANNEL_ID, text=final_post, parse_mode='HTML', disable_web_page_preview=False)
-                    storage.update_article_status(article.id, 'published')
+                    await storage.update_article_status(article.id, 'published')
                     await query.edit_message_text(text=f"🚀 <b>ОПУБЛИКОВАНО</b>", parse_mode='HTML')
                 elif action == "reject":
-                    storage.update_article_status(article_id, 'review_rejected')
+                    await storage.update_article_status(article_id, 'review_rejected')
                     await query.edit_message_text(text="🗑️ <b>ОТПРАВЛЕНО В КОРЗИНУ.</b>", parse_mode='HTML')
     except Exception as e:
         logger.error(f"Ошибка в обработчике кнопок: {e}", exc_info=True)
 
+async def shutdown_storage(app: Application):
+    storage.shutdown()
+
 # --- ГЛАВНАЯ ФУНКЦИЯ ЗАПУСКА ---
 def run_telegram_bot():
     logger.info("Запуск Telegram-бота...")
-    application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).post_shutdown(shutdown_storage).build()
     application.add_handler(CommandHandler(["start", "menu"], start_command))
     application.add_handler(CallbackQueryHandler(button_callback_handler))
     logger.info("Бот запущен и готов к работе.")
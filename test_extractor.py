@@ -14,6 +14,7 @@ sys.path.append(str(project_root))
 
 from services.storage_service import StorageService, Article
 from agents.content_extractor_agent import run_extraction_cycle
+from services.page_renderer import RENDER_SERVICE_URL
 
 # ==============================================================================
 # --- ВАШ ТЕСТОВЫЙ ПОЛИГОН ---
@@ -102,6 +103,8 @@ def run_test_with_profiling():
     print(f"-> Подготовка тестовой базы для {len(TEST_URLS)} URL...")
     storage = prepare_test_db(TEST_URLS)
     print("-> Тестовая база готова.")
+    # С RENDER_SERVICE_URL браузер живет в сервисе рендеринга, и его память в отчет не попадает
+    print(f"-> Рендеринг страниц: {RENDER_SERVICE_URL or 'собственный браузер процесса'}")
     
     # 2. Запуск мониторинга и основного кода
     monitor = ResourceMonitor()